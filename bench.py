@@ -0,0 +1,289 @@
+import argparse
+import random
+import time
+
+from new import (
+    MCTS, BatchGames, Blokus, Board, BitBoard, NumpyBoard, game_configs, get_config, get_minimax_engine, minimax_searches,
+    move_shift, next_player, np, pieces
+)
+
+
+# board sizes and phases of the benchmark positions, a phase is the
+# number of moves played from the empty board, the sizes are played with
+# the default pieces unless a configuration is chosen
+board_sizes = [8, 14, 20]
+phases = {"opening": 2, "midgame": 8, "endgame": 13}
+
+backends = {"list": Board, "bitboard": BitBoard}
+if np is not None:
+    backends["numpy"] = NumpyBoard
+
+
+# starts a game of a configuration with every player moving at random
+def new_game(config, board_class=Board):
+    return Blokus.from_config(config, ["random"] * config.num_players, board_class, verbose=False)
+
+# builds the benchmark position for a configuration and phase by playing seeded
+# random moves, and returns the moves so they can be replayed on any backend
+def build_position(config, phase, seed=0):
+    random.seed(f"{seed}:{config.name}:{phase}")
+    game = new_game(config)
+    moves = []
+    for _ in range(phases[phase]):
+        move = game.select_random_move()
+        if move is None:
+            break
+        moves.append((game.current_player, move))
+        apply_move(game, game.current_player, move)
+    return moves
+
+# plays a move on a game without going through a strategy
+def apply_move(game, player, move):
+    piece_name, piece, x, y, ori = game.move_table.decode(move)
+    game.board.place_piece(piece, x, y, player)
+    game.players[player].remove(piece_name)
+    game.first_move[player] = False
+    game.current_player = next_player(player, len(game.players))
+
+# sets up a benchmark position on the given backend
+def load_position(config, moves, board_class):
+    game = new_game(config, board_class)
+    for player, move in moves:
+        apply_move(game, player, move)
+    return game
+
+
+# builds the distinct rotations and reflections of a piece template without
+# the game's orientation table, so the reference can not share its mistakes
+def reference_orientations(template):
+    found = {}
+    for shape in (template, [row[::-1] for row in template]):
+        for _ in range(4):
+            found.setdefault(tuple(map(tuple, shape)), shape)
+            shape = [list(row) for row in zip(*shape[::-1])]
+    return [
+        (piece, [(i, j) for i in range(len(piece)) for j in range(len(piece[0])) if piece[i][j] == 1])
+        for piece in found.values()
+    ]
+
+# Finds every valid move the slow way, trying each orientation at every
+# offset of the padded board and checking the template square by square.
+# Moves are returned as (piece name, squares covered) so they can be
+# compared with any move generator.
+def reference_valid_moves(game):
+    board = game.board
+    player = game.current_player
+    start = board.starting_corner(player)
+    found = set()
+    for piece_name in game.players[player]:
+        for piece, cells in reference_orientations(game.pieces[piece_name]["shape"]):
+            for x in range(-5, board.dim + 5):
+                for y in range(-5, board.dim + 5):
+                    touching_corner = False
+                    valid = True
+                    for i in range(len(piece)):
+                        for j in range(len(piece[0])):
+                            square = board.get_square(x + i, y + j)
+                            if piece[i][j] == 1 and square != 0:
+                                valid = False
+                            elif piece[i][j] == 3 and square == player:
+                                valid = False
+                            elif piece[i][j] == 2 and square == player:
+                                touching_corner = True
+                            if piece[i][j] == 1 and game.first_move[player] and (x + i, y + j) == start:
+                                touching_corner = True
+                    if valid and touching_corner:
+                        found.add((piece_name, frozenset((x + i, y + j) for i, j in cells)))
+    return found
+
+# gets the moves of a move generator in the same form as reference_valid_moves
+def move_squares(game, moves):
+    squares = set()
+    for move in moves:
+        piece_name, piece, x, y, ori = game.move_table.decode(move)
+        cells = game.move_table.cells[move >> move_shift]
+        squares.add((piece_name, frozenset((x + i, y + j) for i, j in cells)))
+    return squares
+
+
+# times a function over a list of argument tuples, returns the per call latencies
+def time_calls(function, calls, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            function(*args)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+# gets a percentile of a list of latencies
+def percentile(latencies, p):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+# prints one line of results
+def report(backend, config, phase, name, latencies, items=None, label=""):
+    total = sum(latencies)
+    line = (f"{backend:<9} {config.name:<8} {phase:<8} {name:<22}"
+            f" calls={len(latencies):<7}"
+            f" p50={percentile(latencies, 50) * 1e6:9.1f}us"
+            f" p90={percentile(latencies, 90) * 1e6:9.1f}us"
+            f" p99={percentile(latencies, 99) * 1e6:9.1f}us")
+    if items is not None and total > 0:
+        line += f" {items / total:12.0f} {label}/s"
+    print(line)
+
+
+# runs every benchmark on one position and backend, returns False if the
+# move generator disagreed with the reference
+def bench_position(backend, config, phase, moves, repeat, depth, search, settings):
+    game = load_position(config, moves, backends[backend])
+    board = game.board
+    player = game.current_player
+    first_move = game.first_move[player]
+
+    # check the moves against the reference before timing anything
+    valid_moves = game.get_valid_moves()
+    matches = move_squares(game, valid_moves) == reference_valid_moves(game)
+    if not matches:
+        print(f"{backend} {config.name} {phase}: move list does not match the reference")
+
+    latencies = time_calls(game.get_valid_moves, [()], repeat)
+    report(backend, config, phase, "get_valid_moves", latencies, len(valid_moves) * repeat, "moves")
+
+    # every placement the anchor generator would try
+    candidates = []
+    for piece_name in game.players[player]:
+        for ori, piece, cells in game.orientations[piece_name]:
+            for anchor_x, anchor_y in board.get_anchors(player, first_move):
+                for i, j in cells:
+                    candidates.append((piece, anchor_x - i, anchor_y - j, player, first_move))
+    if candidates:
+        latencies = time_calls(board.is_move_valid, candidates, repeat)
+        report(backend, config, phase, "is_move_valid", latencies, len(latencies), "checks")
+
+    latencies = time_calls(board.get_corner_diff, [()], repeat * 100)
+    report(backend, config, phase, "get_corner_diff", latencies)
+
+    scored = [(piece, x, y, player) for piece_name, piece, x, y, ori in map(game.move_table.decode, valid_moves)]
+    if scored:
+        latencies = time_calls(board.corner_diff_for_move, scored, repeat)
+        report(backend, config, phase, "corner_diff_for_move", latencies, len(latencies), "moves")
+
+    # minimax only plays two player games, the node counts are per search
+    if search and config.num_players == 2:
+        for strategy in minimax_searches:
+            engine = get_minimax_engine(strategy, settings)
+            latencies = []
+            nodes = 0
+            start_pruned, start_reduced = engine.pruned, engine.reduced
+            for _ in range(repeat):
+                if engine.table is not None:
+                    engine.table.clear()
+                start_nodes = engine.nodes
+                start = time.perf_counter()
+                game.get_minimax_move(strategy, depth=depth, settings=settings)
+                latencies.append(time.perf_counter() - start)
+                nodes += engine.nodes - start_nodes
+            report(backend, config, phase, f"minimax-{strategy} d{depth}", latencies, nodes, "nodes")
+            print(f"{'':<42} nodes={nodes // repeat} pruned={(engine.pruned - start_pruned) // repeat}"
+                  f" reduced={(engine.reduced - start_reduced) // repeat}")
+
+    return matches
+
+# searches the benchmark position with MCTS, advances the tree through the
+# most visited move and reply as a game would, and checks the next search
+# carries on from the visits the advanced root already had
+def check_mcts_reuse(config, moves, iterations):
+    game = load_position(config, moves, BitBoard)
+    state = game.get_state()
+    tree = MCTS()
+    tree.search(state, iterations=iterations)
+    for _ in range(2):
+        if not tree.root.children:
+            break
+        move = max(tree.root.children, key=lambda child: child.visits).move
+        tree.advance(move)
+        state.apply(move)
+    root, visits = tree.root, tree.root.visits
+    tree.search(state, iterations=10)
+    kept = tree.root is root and tree.root.visits == visits + 10
+    print(f"mcts {config.name}: advanced root {'kept' if kept else 'lost'} its {visits} visits")
+    return kept
+
+# plays a game with a timed minimax player against "large" and checks that
+# every move after its first, which may search the first ply past the
+# budget, takes at most 1.2 times the budget
+def check_think_time(config, board_class, budget_ms):
+    strategies = [f"minimax-combo@{budget_ms}ms,endgame=0"] + ["large"] * (config.num_players - 1)
+    game = Blokus.from_config(config, strategies, board_class, verbose=False, seed=0)
+    think_times = []
+    value = 0
+    while value == 0:
+        player = game.current_player
+        start = time.perf_counter()
+        value = game.make_move()
+        if player == 1:
+            think_times.append(time.perf_counter() - start)
+    slowest = max(think_times[1:], default=0.0)
+    print(f"think {config.name} {board_class.__name__}: slowest move {slowest * 1000:.0f}ms of a {budget_ms}ms budget")
+    return slowest <= 1.2 * budget_ms / 1000
+
+# times whole games played with each batch policy, n at a time
+def bench_batch(config, n, repeat, seed):
+    for policy in BatchGames.policies:
+        latencies = []
+        for i in range(repeat):
+            games = BatchGames(config, n, seed + i)
+            start = time.perf_counter()
+            games.play([policy] * config.num_players)
+            latencies.append(time.perf_counter() - start)
+        report("batch", config, "game", f"{policy} x{n}", latencies, n * repeat, "games")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark move generation, evaluation and search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=board_sizes)
+    parser.add_argument("--configs", nargs="+", choices=list(game_configs), help="benchmark these configurations instead of --sizes")
+    parser.add_argument("--phases", nargs="+", default=list(phases), choices=list(phases))
+    parser.add_argument("--backends", nargs="+", default=list(backends), choices=list(backends))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--no-search", action="store_true")
+    parser.add_argument("--window", type=int, help="forward pruning window of the searches, -1 for none")
+    parser.add_argument("--lmr", action="store_true", help="search with late move reductions")
+    parser.add_argument("--batch", type=int, default=1000, help="games per batch of the batch simulator, 0 to skip it")
+    parser.add_argument("--mcts", type=int, default=1000, help="playouts of the MCTS tree reuse check, 0 to skip it")
+    parser.add_argument("--think", type=int, default=100, help="budget in ms of the think time check on duo, 0 to skip it")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.configs:
+        configs = [game_configs[name] for name in args.configs]
+    else:
+        configs = [get_config(board_dim, pieces) for board_dim in args.sizes]
+    
+    settings = {"lmr": int(args.lmr)}
+    if args.window is not None:
+        settings["window"] = args.window
+    
+    all_match = True
+    reused = True
+    for config in configs:
+        for phase in args.phases:
+            moves = build_position(config, phase, args.seed)
+            for backend in args.backends:
+                all_match &= bench_position(backend, config, phase, moves, args.repeat, args.depth, not args.no_search, settings)
+        if args.mcts:
+            reused &= check_mcts_reuse(config, build_position(config, "opening", args.seed), args.mcts)
+        if np is not None and args.batch:
+            bench_batch(config, args.batch, args.repeat, args.seed)
+
+    on_time = not args.think or check_think_time(game_configs["duo"], Board, args.think)
+
+    if not all_match:
+        raise SystemExit("move lists did not match the reference")
+    if not reused:
+        raise SystemExit("MCTS did not reuse the advanced tree")
+    if not on_time:
+        raise SystemExit("a timed search overran its budget")
@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+
+from new import (
+    MCTS, BitBoard, Blokus, OpeningBook, minimax_searches, parse_budget, pieces
+)
+
+
+# searches a position for the book, returns the best move and its score
+def search_position(state, engine, budget):
+    time_limit, limit = parse_budget(budget)
+    if engine == "mcts":
+        tree = MCTS("large")
+        move = tree.search(state, limit, time_limit)
+        best = max(tree.root.children, key=lambda child: child.visits)
+
+        # score MCTS moves by their win rate in thousandths
+        return move, round(1000 * best.wins / best.visits)
+
+    search = minimax_searches[engine.split("-")[1]]
+    if search.table is not None:
+        search.table.clear()
+    score, move, depth = search.iterative_search(state, time_limit=time_limit, node_limit=limit)
+    return move, score
+
+# Adds the positions up to the given number of moves from the current one
+# to the book. Each position is searched once: positions already in the
+# book, including mirror images, are skipped along with their children.
+def explore(book, state, plies, engine, budget):
+    if plies == 0 or state.is_over() or state in book:
+        return
+    valid_moves = state.get_valid_moves()
+    if not valid_moves:
+        return
+
+    start = time.perf_counter()
+    move, score = search_position(state, engine, budget)
+    book.add(state, move, score)
+    print(f"{len(book.entries):5d} positions, {piece_count(state)} pieces placed, "
+          f"{state.move_table.describe(move)} score {score} in {time.perf_counter() - start:.2f}s")
+
+    for move in valid_moves:
+        state.apply(move)
+        explore(book, state, plies - 1, engine, budget)
+        state.undo()
+
+# gets the number of pieces on the board
+def piece_count(state):
+    return 2 * len(state.pieces) - len(state.players[1]) - len(state.players[2])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book from self-play search")
+    parser.add_argument("path")
+    parser.add_argument("--board", type=int, default=8)
+    parser.add_argument("--plies", type=int, default=2, help="number of opening moves to cover")
+    parser.add_argument("--engine", default="minimax-combo", choices=["mcts"] + [f"minimax-{name}" for name in minimax_searches])
+    parser.add_argument("--budget", default="1s", help="search budget per position, such as 1s or 5000n")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    game = Blokus(args.board, pieces, "random", "random", BitBoard, verbose=False)
+    book = OpeningBook()
+    explore(book, game.get_state(), args.plies, args.engine, args.budget)
+    book.save(args.path, pieces)
+    print(f"Saved {len(book.entries)} positions to {args.path}")
@@ -1,403 +1,3166 @@
+import cProfile
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import pickle
 import random
+import struct
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 # Dimensions of the board
 board_dimensions = 8
 
+# squares of every polyomino piece as (row, column) pairs, the full set of 21
+polyominoes = {
+    "plus": [(0, 1), (1, 0), (1, 1), (1, 2), (2, 1)],
+    "F": [(0, 1), (0, 2), (1, 0), (1, 1), (2, 1)],
+    "line5": [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)],
+    "L5": [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1)],
+    "N": [(0, 1), (1, 1), (2, 0), (2, 1), (3, 0)],
+    "P": [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0)],
+    "T5": [(0, 0), (0, 1), (0, 2), (1, 1), (2, 1)],
+    "U": [(0, 0), (0, 2), (1, 0), (1, 1), (1, 2)],
+    "V": [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)],
+    "W": [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)],
+    "Y": [(0, 1), (1, 0), (1, 1), (2, 1), (3, 1)],
+    "Z": [(0, 0), (0, 1), (1, 1), (2, 1), (2, 2)],
+    "L": [(0, 0), (1, 0), (2, 0), (2, 1)],
+    "T": [(0, 0), (1, 0), (1, 1), (2, 0)],
+    "square": [(0, 0), (0, 1), (1, 0), (1, 1)],
+    "line4": [(0, 0), (1, 0), (2, 0), (3, 0)],
+    "S": [(0, 0), (1, 0), (1, 1), (2, 1)],
+    "corner": [(0, 0), (1, 0), (1, 1)],
+    "line3": [(0, 0), (1, 0), (2, 0)],
+    "line2": [(0, 0), (1, 0)],
+    "dot": [(0, 0)]
+}
+
+# Builds the padded template of a piece from its squares:
 # 0 = empty square
 # 1 = square occupied by the piece
 # 2 = valid corner-touching position
 # 3 = invalid block-touching position
-pieces = {
-    "plus": {
-        "shape": [
-        [0, 2, 3, 2, 0],
-        [2, 3, 1, 3, 2],
-        [3, 1, 1, 1, 3],
-        [2, 3, 1, 3, 2],
-        [0, 2, 3, 2, 0]
-        ],
-        "value": 5
-    },
-    "L": {
-        "shape": [
-        [2, 3, 2, 0],
-        [3, 1, 3, 0],
-        [3, 1, 3, 2],
-        [3, 1, 1, 3],
-        [2, 3, 3, 2]
-        ],
-        "value": 4
-    },
-    "T": {
-        "shape": [
-        [2, 3, 2, 0],
-        [3, 1, 3, 2],
-        [3, 1, 1, 3],
-        [3, 1, 3, 2],
-        [2, 3, 2, 0]
-        ],
-        "value": 4
-    },
-    "square": {
-        "shape": [
-        [2, 3, 3, 2],
-        [3, 1, 1, 3],
-        [3, 1, 1, 3],
-        [2, 3, 3, 2]
-        ],
-        "value": 4
-    },
-    "corner": {
-        "shape": [
-        [2, 3, 2, 0],
-        [3, 1, 3, 2],
-        [3, 1, 1, 3],
-        [2, 3, 3, 2]
-        ],
-        "value": 3
-    },
-    "line3": {
-        "shape": [
-        [2, 3, 2],
-        [3, 1, 3],
-        [3, 1, 3],
-        [3, 1, 3],
-        [2, 3, 2]
-        ],
-        "value": 3
-    },
-    "line2": {
-        "shape": [
-        [2, 3, 2],
-        [3, 1, 3],
-        [3, 1, 3],
-        [2, 3, 2]
-        ],
-        "value": 2
-    },
-    "dot": {
-        "shape": [
-        [2, 3, 2],
-        [3, 1, 3],
-        [2, 3, 2]
-        ],
-        "value": 1
+def polyomino_template(cells):
+    rows = max(i for i, j in cells) + 3
+    columns = max(j for i, j in cells) + 3
+    occupied = {(i + 1, j + 1) for i, j in cells}
+    shape = [[0] * columns for _ in range(rows)]
+    for i in range(rows):
+        for j in range(columns):
+            if (i, j) in occupied:
+                shape[i][j] = 1
+            elif any((i + di, j + dj) in occupied for di, dj in ((-1, 0), (1, 0), (0, -1), (0, 1))):
+                shape[i][j] = 3
+            elif any((i + di, j + dj) in occupied for di, dj in ((-1, -1), (-1, 1), (1, -1), (1, 1))):
+                shape[i][j] = 2
+    return shape
+
+# builds a piece set from piece names, each piece is worth its number of squares
+def make_piece_set(piece_names):
+    return {
+        piece_name: {"shape": polyomino_template(polyominoes[piece_name]), "value": len(polyominoes[piece_name])}
+        for piece_name in piece_names
+    }
+
+# the default pieces, and the full set played on the standard and Duo boards
+pieces = make_piece_set(["plus", "L", "T", "square", "corner", "line3", "line2", "dot"])
+all_pieces = make_piece_set(polyominoes)
+
+# piece sets made so far, keyed by their piece names
+named_piece_sets = {tuple(pieces): pieces, tuple(all_pieces): all_pieces}
+
+# gets the piece set of some piece names, the same dict for the same names
+def piece_set_from_names(piece_names):
+    piece_names = tuple(piece_names)
+    if piece_names not in named_piece_sets:
+        named_piece_sets[piece_names] = make_piece_set(piece_names)
+    return named_piece_sets[piece_names]
+
+# names of the orientations in the order they are generated
+orientation_names = ["up", "right", "down", "left", "flip-up", "flip-right", "flip-down", "flip-left"]
+
+# rotates a piece template 90 degrees clockwise
+def rotate_shape(shape):
+    return [[shape[j][i] for j in range(len(shape) - 1, -1, -1)] for i in range(len(shape[0]))]
+
+# mirrors a piece template left to right
+def flip_shape(shape):
+    return [row[::-1] for row in shape]
+
+# squares of each piece template seen so far, keyed by the id of the template
+cell_cache = {}
+
+# gets the positions of the squares a piece template occupies
+def shape_cells(shape):
+    entry = cell_cache.get(id(shape))
+    if entry is None:
+        cells = [(i, j) for i in range(len(shape)) for j in range(len(shape[0])) if shape[i][j] == 1]
+        
+        # keep the template alive so its id can not be reused
+        entry = (shape, cells)
+        cell_cache[id(shape)] = entry
+    return entry[1]
+
+# builds every distinct orientation (rotations and reflections) of every piece,
+# along with the squares each orientation occupies
+def build_orientations(pieces):
+    table = {}
+    for piece_name, piece in pieces.items():
+        table[piece_name] = []
+        seen = set()
+        shape = piece["shape"]
+        for flip in range(2):
+            for rotation in range(4):
+                key = tuple(tuple(row) for row in shape)
+                
+                # symmetric pieces produce the same template more than once
+                if key not in seen:
+                    seen.add(key)
+                    table[piece_name].append((orientation_names[flip * 4 + rotation], shape, shape_cells(shape)))
+                shape = rotate_shape(shape)
+            shape = flip_shape(piece["shape"])
+    return table
+
+# orientation tables built so far, keyed by the id of the piece set
+orientation_cache = {}
+
+# gets the orientation table for a piece set, building it only once
+def get_orientations(piece_set):
+    if id(piece_set) not in orientation_cache:
+        orientation_cache[id(piece_set)] = (piece_set, build_orientations(piece_set))
+    return orientation_cache[id(piece_set)][1]
+
+# every orientation of the default pieces, computed at load time
+orientations = get_orientations(pieces)
+
+# Moves are ints. The bits above move_shift hold the orientation id, the
+# piece index times 8 plus the position of the orientation's name in
+# orientation_names, and the bits below hold the offset of the template,
+# (x + 5) * (dim + 10) + y + 5, which is also the index of the placement in
+# BitBoard.placement_masks. A pass is None.
+move_shift = 12
+piece_shift = move_shift + 3
+cell_mask = (1 << move_shift) - 1
+
+# Lookup tables to encode and decode the moves of a board size and piece set
+class MoveTable:
+    def __init__(self, board_dim, piece_set):
+        self.board_dim = board_dim
+        self.span = board_dim + 10
+        if self.span * self.span > cell_mask + 1:
+            raise ValueError(f"Moves can not be encoded on a {board_dim}x{board_dim} board")
+        self.piece_names = list(piece_set)
+        self.piece_index = {piece_name: i for i, piece_name in enumerate(self.piece_names)}
+        self.values = [piece["value"] for piece in piece_set.values()]
+        
+        # template and squares of each orientation id, None for ids of duplicate orientations
+        self.shapes = [None] * (8 * len(piece_set))
+        self.cells = [None] * (8 * len(piece_set))
+        
+        # (orientation id shifted into place, template, squares) of each orientation of a piece
+        self.orientations = {}
+        table = get_orientations(piece_set)
+        for index, piece_name in enumerate(self.piece_names):
+            self.orientations[piece_name] = []
+            for ori, shape, cells in table[piece_name]:
+                orientation_id = index * 8 + orientation_names.index(ori)
+                self.shapes[orientation_id] = shape
+                self.cells[orientation_id] = cells
+                self.orientations[piece_name].append((orientation_id << move_shift, shape, cells))
+        
+        # (x, y) of each template offset
+        self.offsets = [(cell // self.span - 5, cell % self.span - 5) for cell in range(self.span * self.span)]
+        
+        # BitBoard placement masks of each orientation id, made on first use
+        self.masks = None
+    
+    def encode(self, piece_name, ori, x, y):
+        orientation_id = self.piece_index[piece_name] * 8 + orientation_names.index(ori)
+        return orientation_id << move_shift | (x + 5) * self.span + y + 5
+    
+    # gets a move as (piece name, template, x, y, orientation name)
+    def decode(self, move):
+        orientation_id = move >> move_shift
+        x, y = self.offsets[move & cell_mask]
+        return self.piece_names[move >> piece_shift], self.shapes[orientation_id], x, y, orientation_names[orientation_id & 7]
+    
+    # gets the value of the piece a move places
+    def value(self, move):
+        return self.values[move >> piece_shift]
+    
+    # describes a move for output
+    def describe(self, move):
+        piece_name, piece, x, y, ori = self.decode(move)
+        return f"{piece_name} {ori} at ({x}, {y})"
+    
+    # gets the placement masks of every orientation id on a BitBoard of the table's size
+    def get_masks(self):
+        if self.masks is None:
+            board = BitBoard(self.board_dim)
+            self.masks = [None if shape is None else board.placement_masks(shape) for shape in self.shapes]
+        return self.masks
+
+# move tables made so far, keyed by board size and id of the piece set
+move_table_cache = {}
+
+# gets the move table of a board size and piece set, building it only once
+def get_move_table(board_dim, piece_set):
+    key = (board_dim, id(piece_set))
+    if key not in move_table_cache:
+        move_table_cache[key] = (piece_set, MoveTable(board_dim, piece_set))
+    return move_table_cache[key][1]
+
+# offsets of the squares diagonal to a square
+diagonal_offsets = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# keys handed out so far, keyed by their name
+zobrist_cache = {}
+
+# gets a 64 bit key for Zobrist hashing, seeded by its name so hashes
+# are the same on every run
+def zobrist_key(*parts):
+    key = zobrist_cache.get(parts)
+    if key is None:
+        key = random.Random(":".join(str(part) for part in parts)).getrandbits(64)
+        zobrist_cache[parts] = key
+    return key
+
+# square keys for each board size, indexed by player, x and y
+zobrist_square_cache = {}
+
+def zobrist_square_keys(board_dim):
+    if board_dim not in zobrist_square_cache:
+        zobrist_square_cache[board_dim] = {
+            player: [[zobrist_key("square", player, x, y) for y in range(board_dim)] for x in range(board_dim)]
+            for player in (1, 2, 3, 4)
+        }
+    return zobrist_square_cache[board_dim]
+
+# gets the starting corners of the players, two players start in opposite
+# corners and four players start in every corner going clockwise
+def corner_starts(board_dim, num_players=2):
+    last = board_dim - 1
+    if num_players == 2:
+        return ((0, 0), (last, last))
+    return ((0, 0), (0, last), (last, last), (last, 0))
+
+# gets the player who moves after a player
+def next_player(player, num_players):
+    return player % num_players + 1
+
+# gets the player who moved before a player
+def previous_player(player, num_players):
+    return (player - 2) % num_players + 1
+
+class Board:
+    def __init__(self, board_dim, starts=None):
+        self.dim = board_dim
+        self.squares = [[0 for _ in range(board_dim)] for _ in range(board_dim)]
+        
+        # starting square of each player, player 1 first
+        self.starts = tuple(starts or corner_starts(board_dim))
+        self.player_ids = tuple(range(1, len(self.starts) + 1))
+        
+        # kept up to date by place_piece and undo_move
+        self.blocks = {player: 0 for player in self.player_ids}
+        self.corners = {player: set() for player in self.player_ids}
+        self.keys = zobrist_square_keys(board_dim)
+        self.hash = zobrist_key("board", board_dim)
+    
+    # gets the number of blocks for a player
+    def get_num_blocks(self, player):
+        return self.blocks[player]
+    
+    # gets the block diff between the two players
+    def get_block_diff(self):
+        return self.blocks[1] - self.blocks[2]
+    
+    # determines whether a cell is a corner for a given player
+    def is_corner(self, x, y, player):
+        return (x, y) in self.corners[player]
+    
+    # determines whether an empty cell touches a player's piece diagonally
+    def touches_corner(self, x, y, player):
+        for dx, dy in diagonal_offsets:
+            if self.get_square(x + dx, y + dy) == player:
+                return True
+        return False
+        
+    # gets the number of corners for a player    
+    def num_corners(self, player):
+        return len(self.corners[player])
+    
+    # Gets the corner diff between the two players
+    def get_corner_diff(self):
+        return len(self.corners[1]) - len(self.corners[2])
+    
+    # gets the value of a square
+    def get_square(self, x, y):
+        if 0 <= x < self.dim and 0 <= y < self.dim:
+            return self.squares[x][y]
+        return -1
+    
+    # gets the starting square for a player
+    def starting_corner(self, player):
+        return self.starts[player - 1]
+    
+    # gets the squares a player's next piece may cover to touch one of its corners
+    def get_anchors(self, player, is_first_move):
+        anchors = []
+        if is_first_move and self.get_square(*self.starting_corner(player)) == 0:
+            anchors.append(self.starting_corner(player))
+        for x, y in sorted(self.corners[player]):
+            if (self.get_square(x - 1, y) != player and
+                self.get_square(x + 1, y) != player and
+                self.get_square(x, y - 1) != player and
+                self.get_square(x, y + 1) != player
+            ):
+                anchors.append((x, y))
+        return anchors
+    
+    # gets all valid moves for a player, only trying placements that cover one of its anchors
+    def get_valid_moves(self, piece_names, move_table, player, is_first_move):
+        anchors = self.get_anchors(player, is_first_move)
+        span = move_table.span
+        valid_moves = array("i")
+        for piece_name in piece_names:
+            for base, piece, cells in move_table.orientations[piece_name]:
+                
+                # several anchors can lead to the same placement, only check it once
+                tried = set()
+                for anchor_x, anchor_y in anchors:
+                    for i, j in cells:
+                        x, y = anchor_x - i, anchor_y - j
+                        if (x, y) in tried:
+                            continue
+                        tried.add((x, y))
+                        if self.is_move_valid(piece, x, y, player, is_first_move):
+                            valid_moves.append(base | (x + 5) * span + y + 5)
+        return valid_moves
+    
+    # determines if a piece (already in its orientation) can be placed at a given position
+    def is_move_valid(self, piece, x, y, current_player, is_first_move):
+        
+        touching_corner = False
+        
+        # starting corner for each player
+        corner_x, corner_y = self.starting_corner(current_player)
+    
+        # iterate over the piece
+        for i in range(len(piece)):
+            for j in range(len(piece[0])):
+                
+                # ensure the piece is within the board bounds and the position is empty
+                if piece[i][j] == 1 and self.get_square(x + i, y + j) != 0:
+                    return False
+                
+            
+                # ensure the piece has a corner touching another piece of the same player
+                if piece[i][j] == 2 and self.get_square(x + i, y + j) == current_player:
+                    touching_corner = True
+            
+                # ensure the piece does not have a block touching another piece of the same player
+                if piece[i][j] == 3 and self.get_square(x + i, y + j) == current_player:
+                    return False
+                
+                # If its the first, move the piece must touch the starting corner
+                if (piece[i][j] == 1 and 
+                    is_first_move and
+                    (corner_x, corner_y) == (x + i, y + j)
+                ):
+                    touching_corner = True
+
+        # Return true as long as there was at least one corner
+        return touching_corner
+    
+    # places a piece (already in its orientation) on the board
+    def place_piece(self, piece, x, y, current_player):
+        
+        cells = [(x + i, y + j) for i, j in shape_cells(piece)]
+        keys = self.keys[current_player]
+        for cx, cy in cells:
+            self.squares[cx][cy] = current_player
+            self.hash ^= keys[cx][cy]
+            for corners in self.corners.values():
+                corners.discard((cx, cy))
+        self.blocks[current_player] += len(cells)
+        
+        # empty squares diagonal to the piece become corners of the player
+        for cx, cy in cells:
+            for dx, dy in diagonal_offsets:
+                if self.get_square(cx + dx, cy + dy) == 0:
+                    self.corners[current_player].add((cx + dx, cy + dy))
+    
+    # undo a move            
+    def undo_move(self, piece, x, y):
+        
+        cells = [(x + i, y + j) for i, j in shape_cells(piece)]
+        player = self.squares[cells[0][0]][cells[0][1]]
+        keys = self.keys[player]
+        for cx, cy in cells:
+            self.squares[cx][cy] = 0
+            self.hash ^= keys[cx][cy]
+        self.blocks[player] -= len(cells)
+        
+        # the freed squares can be corners again, and the squares around
+        # them may no longer touch the player's pieces
+        for cx, cy in cells:
+            for other in self.player_ids:
+                if self.touches_corner(cx, cy, other):
+                    self.corners[other].add((cx, cy))
+            for dx, dy in diagonal_offsets:
+                if ((cx + dx, cy + dy) in self.corners[player] and
+                    not self.touches_corner(cx + dx, cy + dy, player)
+                ):
+                    self.corners[player].discard((cx + dx, cy + dy))
+                
+    
+    # Gets the corner diff of a move, from the moving player's point of view.
+    # Only the squares around the piece are looked at and the board is not
+    # changed: the player gains the empty squares diagonal to the piece that
+    # were not already its corners, and every player loses the corners the
+    # piece covers.
+    def corner_diff_for_move(self, piece, x, y, current_player):
+        
+        cells = [(x + i, y + j) for i, j in shape_cells(piece)]
+        covered = set(cells)
+        corners = self.corners[current_player]
+        opponent_corners = [self.corners[other] for other in self.player_ids if other != current_player]
+        
+        created = set()
+        value = 0
+        for cell in cells:
+            if cell in corners:
+                value -= 1
+            for other_corners in opponent_corners:
+                if cell in other_corners:
+                    value += 1
+            for dx, dy in diagonal_offsets:
+                corner = (cell[0] + dx, cell[1] + dy)
+                if (corner not in covered and
+                    corner not in corners and
+                    self.get_square(corner[0], corner[1]) == 0
+                ):
+                    created.add(corner)
+        return value + len(created)
+    
+    # gets (corner diff, size) of every move in a list for the moving player
+    def score_moves(self, moves, move_table, current_player):
+        scores = []
+        for move in moves:
+            x, y = move_table.offsets[move & cell_mask]
+            piece = move_table.shapes[move >> move_shift]
+            scores.append((self.corner_diff_for_move(piece, x, y, current_player), len(move_table.cells[move >> move_shift])))
+        return scores
+                    
+                    
+    # prints the board
+    def print_board(self):
+        symbols = {0: " ", 1: "X", 2: "O", 3: "+", 4: "*"}
+        border = "─" * (self.dim * 2 + 2)
+        lines = [border]
+        for row in self.squares:
+            lines.append("|" + "".join(symbols.get(cell, "#") + " " for cell in row) + "|")
+        lines.append(border)
+        print("\n".join(lines))
+
+
+# Board that stores each player's squares as bits of an integer.
+# Square (x, y) is bit x * (dim + 1) + y, the extra column keeps shifted
+# masks from wrapping from one row into the next.
+class BitBoard(Board):
+    
+    # pre-shifted placement masks, keyed by board size and then by piece shape
+    mask_cache = {}
+    
+    def __init__(self, board_dim, starts=None):
+        self.dim = board_dim
+        self.width = board_dim + 1
+        self.span = board_dim + 10
+        self.board_mask = 0
+        for x in range(board_dim):
+            self.board_mask |= ((1 << board_dim) - 1) << (x * self.width)
+        self.starts = tuple(starts or corner_starts(board_dim))
+        self.player_ids = tuple(range(1, len(self.starts) + 1))
+        self.occupied = 0
+        self.owned = {player: 0 for player in self.player_ids}
+        
+        # empty squares diagonal to a player's squares
+        self.frontier = {player: 0 for player in self.player_ids}
+        
+        # squares sharing an edge with a player's squares
+        self.forbidden = {player: 0 for player in self.player_ids}
+        
+        # starting square for each player
+        self.start = {player: self.bit(*self.starting_corner(player)) for player in self.player_ids}
+        self.masks = BitBoard.mask_cache.setdefault(board_dim, {})
+        self.keys = zobrist_square_keys(board_dim)
+        self.hash = zobrist_key("board", board_dim)
+    
+    # builds a BitBoard from rows of square values
+    @classmethod
+    def from_squares(cls, squares, starts=None):
+        bit_board = cls(len(squares), starts)
+        for x, row in enumerate(squares):
+            for y, player in enumerate(row):
+                if player > 0:
+                    bit_board.owned[player] |= bit_board.bit(x, y)
+                    bit_board.occupied |= bit_board.bit(x, y)
+                    bit_board.hash ^= bit_board.keys[player][x][y]
+        bit_board.update_masks()
+        return bit_board
+    
+    # builds a BitBoard holding the same position as another board
+    @classmethod
+    def from_board(cls, board):
+        return cls.from_squares(board.squares, board.starts)
+    
+    # gets the bit for a square
+    def bit(self, x, y):
+        return 1 << (x * self.width + y)
+    
+    # gets the masks of every placement of a piece, indexed by its offset
+    def placement_masks(self, piece):
+        entry = self.masks.get(id(piece))
+        if entry is None:
+            cells = [(i, j) for i in range(len(piece)) for j in range(len(piece[0])) if piece[i][j] == 1]
+            placements = []
+            for x in range(-5, self.dim + 5):
+                for y in range(-5, self.dim + 5):
+                    mask = 0
+                    for i, j in cells:
+                        if not (0 <= x + i < self.dim and 0 <= y + j < self.dim):
+                            mask = None
+                            break
+                        mask |= self.bit(x + i, y + j)
+                    placements.append(mask)
+                    
+            # keep the shape alive so its id can not be reused
+            entry = (piece, placements)
+            self.masks[id(piece)] = entry
+        return entry[1]
+    
+    # gets the mask of a piece placed at a given position
+    def piece_mask(self, piece, x, y):
+        if not (-5 <= x < self.dim + 5 and -5 <= y < self.dim + 5):
+            return None
+        return self.placement_masks(piece)[(x + 5) * self.span + y + 5]
+    
+    # recomputes the frontier and forbidden masks from the occupied squares
+    def update_masks(self):
+        w = self.width
+        empty = self.board_mask & ~self.occupied
+        for player, own in self.owned.items():
+            self.forbidden[player] = self.edges(own)
+            self.frontier[player] = ((own << (w + 1)) | (own << (w - 1)) | (own >> (w - 1)) | (own >> (w + 1))) & empty
+    
+    @property
+    def squares(self):
+        return [[self.get_square(x, y) for y in range(self.dim)] for x in range(self.dim)]
+    
+    def get_anchors(self, player, is_first_move):
+        anchors = []
+        if is_first_move and not self.start[player] & self.occupied:
+            anchors.append(self.starting_corner(player))
+        remaining = self.frontier[player] & ~self.forbidden[player]
+        while remaining:
+            low = remaining & -remaining
+            anchors.append(divmod(low.bit_length() - 1, self.width))
+            remaining ^= low
+        return anchors
+    
+    # same moves in the same order as Board.get_valid_moves, with the masks
+    # of each orientation looked up once and the checks of is_move_valid inlined
+    def get_valid_moves(self, piece_names, move_table, player, is_first_move):
+        anchors = self.get_anchors(player, is_first_move)
+        blocked = self.occupied | self.forbidden[player]
+        touching = self.frontier[player]
+        if is_first_move:
+            touching |= self.start[player]
+        span = self.span
+        masks = move_table.get_masks()
+        valid_moves = array("i")
+        for piece_name in piece_names:
+            for base, piece, cells in move_table.orientations[piece_name]:
+                placements = masks[base >> move_shift]
+                tried = set()
+                for anchor_x, anchor_y in anchors:
+                    for i, j in cells:
+                        index = (anchor_x - i + 5) * span + anchor_y - j + 5
+                        if index in tried:
+                            continue
+                        tried.add(index)
+                        mask = placements[index]
+                        if mask is not None and not mask & blocked and mask & touching:
+                            valid_moves.append(base | index)
+        return valid_moves
+    
+    # gets the squares diagonal to the squares of a mask
+    def diagonals(self, mask):
+        w = self.width
+        return ((mask << (w + 1)) | (mask << (w - 1)) | (mask >> (w - 1)) | (mask >> (w + 1))) & self.board_mask
+    
+    # gets the squares sharing an edge with the squares of a mask
+    def edges(self, mask):
+        w = self.width
+        return ((mask << 1) | (mask >> 1) | (mask << w) | (mask >> w)) & self.board_mask
+    
+    def corner_diff_for_move(self, piece, x, y, current_player):
+        mask = self.piece_mask(piece, x, y)
+        corners = self.frontier[current_player]
+        created = self.diagonals(mask) & ~(self.occupied | mask | corners)
+        value = created.bit_count() - (mask & corners).bit_count()
+        for other in self.player_ids:
+            if other != current_player:
+                value += (mask & self.frontier[other]).bit_count()
+        return value
+    
+    def score_moves(self, moves, move_table, current_player):
+        corners = self.frontier[current_player]
+        opponent_corners = [self.frontier[other] for other in self.player_ids if other != current_player]
+        taken = self.occupied | corners
+        masks = move_table.get_masks()
+        scores = []
+        for move in moves:
+            mask = masks[move >> move_shift][move & cell_mask]
+            created = self.diagonals(mask) & ~(taken | mask)
+            value = created.bit_count() - (mask & corners).bit_count()
+            for other_corners in opponent_corners:
+                value += (mask & other_corners).bit_count()
+            scores.append((value, mask.bit_count()))
+        return scores
+    
+    def get_num_blocks(self, player):
+        return self.owned[player].bit_count()
+    
+    def get_block_diff(self):
+        return self.owned[1].bit_count() - self.owned[2].bit_count()
+    
+    def is_corner(self, x, y, player):
+        if not (0 <= x < self.dim and 0 <= y < self.dim):
+            return False
+        return self.frontier[player] & self.bit(x, y) != 0
+    
+    def num_corners(self, player):
+        return self.frontier[player].bit_count()
+    
+    def get_corner_diff(self):
+        return self.frontier[1].bit_count() - self.frontier[2].bit_count()
+    
+    def get_square(self, x, y):
+        if not (0 <= x < self.dim and 0 <= y < self.dim):
+            return -1
+        bit = self.bit(x, y)
+        if self.occupied & bit:
+            for player, own in self.owned.items():
+                if own & bit:
+                    return player
+        return 0
+    
+    def is_move_valid(self, piece, x, y, current_player, is_first_move):
+        mask = self.piece_mask(piece, x, y)
+        
+        # the piece must be on the board, on empty squares and not share an edge with its own color
+        if mask is None or mask & self.occupied or mask & self.forbidden[current_player]:
+            return False
+        
+        # the piece must touch a corner, or the starting corner on the first move
+        if mask & self.frontier[current_player]:
+            return True
+        return is_first_move and mask & self.start[current_player] != 0
+    
+    # updates the hash for a piece being placed or removed
+    def toggle_hash(self, piece, x, y, player):
+        keys = self.keys[player]
+        for i, j in shape_cells(piece):
+            self.hash ^= keys[x + i][y + j]
+    
+    def place_piece(self, piece, x, y, current_player):
+        mask = self.piece_mask(piece, x, y)
+        self.owned[current_player] |= mask
+        self.occupied |= mask
+        self.update_masks()
+        self.toggle_hash(piece, x, y, current_player)
+    
+    def undo_move(self, piece, x, y):
+        mask = self.piece_mask(piece, x, y)
+        player = next(player for player, own in self.owned.items() if own & mask)
+        self.owned[player] &= ~mask
+        self.occupied &= ~mask
+        self.update_masks()
+        self.toggle_hash(piece, x, y, player)
+
+
+# Board that also keeps its squares in an int8 array and finds every legal
+# placement of an orientation at once. Each offset's legality is the
+# sliding-window OR of the piece's squares over the blocked plane (occupied
+# squares, squares off the board and squares sharing an edge with the
+# player) and over the corner plane. It needs numpy.
+class NumpyBoard(Board):
+    
+    # padding around the board so every offset from -5 to dim + 4 has a window
+    pad = 5
+    
+    def __init__(self, board_dim, starts=None):
+        if np is None:
+            raise ImportError("NumpyBoard needs numpy")
+        super().__init__(board_dim, starts)
+        self.grid = np.zeros((board_dim, board_dim), dtype=np.int8)
+    
+    def place_piece(self, piece, x, y, current_player):
+        super().place_piece(piece, x, y, current_player)
+        for i, j in shape_cells(piece):
+            self.grid[x + i, y + j] = current_player
+    
+    def undo_move(self, piece, x, y):
+        super().undo_move(piece, x, y)
+        for i, j in shape_cells(piece):
+            self.grid[x + i, y + j] = 0
+    
+    # gets the blocked and corner planes of a player, padded so that
+    # plane[x + pad + i, y + pad + j] is square (x + i, y + j)
+    def get_planes(self, player, is_first_move):
+        dim, pad = self.dim, self.pad
+        size = dim + 2 * pad + 5
+        
+        own = np.zeros((dim + 2, dim + 2), dtype=bool)
+        own[1:-1, 1:-1] = self.grid == player
+        occupied = self.grid != 0
+        
+        # squares sharing an edge with the player's pieces, and empty squares diagonal to them
+        forbidden = own[:-2, 1:-1] | own[2:, 1:-1] | own[1:-1, :-2] | own[1:-1, 2:]
+        corners = (own[:-2, :-2] | own[:-2, 2:] | own[2:, :-2] | own[2:, 2:]) & ~occupied
+        if is_first_move:
+            corner_x, corner_y = self.starting_corner(player)
+            corners[corner_x, corner_y] |= not occupied[corner_x, corner_y]
+        
+        blocked = np.ones((size, size), dtype=bool)
+        blocked[pad:pad + dim, pad:pad + dim] = occupied | forbidden
+        touching = np.zeros((size, size), dtype=bool)
+        touching[pad:pad + dim, pad:pad + dim] = corners
+        return blocked, touching
+    
+    # gets a boolean map of the legal offsets of one orientation,
+    # legal[x + pad, y + pad] is the placement at (x, y)
+    def legality_map(self, cells, blocked, touching):
+        span = self.dim + 2 * self.pad
+        bad = np.zeros((span, span), dtype=bool)
+        touches = np.zeros((span, span), dtype=bool)
+        for i, j in cells:
+            bad |= blocked[i:i + span, j:j + span]
+            touches |= touching[i:i + span, j:j + span]
+        return touches & ~bad
+    
+    # the legality map of an orientation is laid out like the offsets of the
+    # moves, so the flat index of each legal offset is the low bits of its move
+    def get_valid_moves(self, piece_names, move_table, player, is_first_move):
+        blocked, touching = self.get_planes(player, is_first_move)
+        valid_moves = array("i")
+        for piece_name in piece_names:
+            for base, piece, cells in move_table.orientations[piece_name]:
+                legal = np.flatnonzero(self.legality_map(cells, blocked, touching))
+                valid_moves.extend((legal + base).tolist())
+        return valid_moves
+
+
+# The part of a game that changes as moves are made. Search applies moves
+# to it and undoes them in reverse order, so it can share one board.
+class GameState:
+    def __init__(self, board, pieces, move_table, current_player, players, first_move, cannot_move):
+        self.board = board
+        self.pieces = pieces
+        self.move_table = move_table
+        self.current_player = current_player
+        self.players = {player: list(names) for player, names in players.items()}
+        self.first_move = dict(first_move)
+        self.cannot_move = dict(cannot_move)
+        self.history = []
+        
+        # features and territory for the linear evaluation, set up on first use
+        self.tracker = None
+        self.territory = None
+        
+        # hash of everything but the board, which hashes itself
+        self.key = zobrist_key("side", current_player)
+        for player, names in self.players.items():
+            for piece_name in names:
+                self.key ^= zobrist_key("piece", player, piece_name)
+            if self.first_move[player]:
+                self.key ^= zobrist_key("first", player)
+            if self.cannot_move[player]:
+                self.key ^= zobrist_key("cannot", player)
+    
+    # Zobrist hash of the position: board, side to move, remaining pieces and flags
+    @property
+    def hash(self):
+        return self.board.hash ^ self.key
+    
+    # the game ends once no player can move
+    def is_over(self):
+        return all(self.cannot_move.values())
+    
+    # gets all valid moves for the side to move
+    def get_valid_moves(self):
+        if self.cannot_move[self.current_player]:
+            return []
+        return self.board.get_valid_moves(
+            self.players[self.current_player],
+            self.move_table,
+            self.current_player,
+            self.first_move[self.current_player]
+        )
+    
+    # plays a move for the side to move, None passes because it has no moves
+    def apply(self, move):
+        player = self.current_player
+        following = next_player(player, len(self.players))
+        key = self.key ^ zobrist_key("side", player) ^ zobrist_key("side", following)
+        if move is None:
+            self.history.append((None, None, self.first_move[player], self.cannot_move[player], self.key))
+            if not self.cannot_move[player]:
+                key ^= zobrist_key("cannot", player)
+            self.cannot_move[player] = True
+        else:
+            piece_name, piece, x, y, ori = self.move_table.decode(move)
+            self.board.place_piece(piece, x, y, player)
+            index = self.players[player].index(piece_name)
+            del self.players[player][index]
+            self.history.append((move, index, self.first_move[player], self.cannot_move[player], self.key))
+            key ^= zobrist_key("piece", player, piece_name)
+        if self.first_move[player]:
+            key ^= zobrist_key("first", player)
+        self.first_move[player] = False
+        self.current_player = following
+        self.key = key
+        if self.tracker is not None:
+            self.tracker.apply(player, move)
+        if self.territory is not None:
+            self.territory.apply(player, move)
+    
+    # takes back the last move
+    def undo(self):
+        move, index, first_move, cannot_move, key = self.history.pop()
+        player = previous_player(self.current_player, len(self.players))
+        if move is not None:
+            piece_name, piece, x, y, ori = self.move_table.decode(move)
+            self.board.undo_move(piece, x, y)
+            self.players[player].insert(index, piece_name)
+        self.first_move[player] = first_move
+        self.cannot_move[player] = cannot_move
+        self.current_player = player
+        self.key = key
+        if self.tracker is not None:
+            self.tracker.undo(player, move)
+        if self.territory is not None:
+            self.territory.undo(player, move)
+    
+    # gets the features of the position, following the moves from now on
+    def track_features(self):
+        if self.tracker is None:
+            self.tracker = FeatureTracker(self)
+        return self.tracker
+    
+    # gets the territory analysis of the position, following the moves from now on
+    def analyze_territory(self):
+        if self.territory is None:
+            self.territory = TerritoryAnalyzer(self)
+        return self.territory
+
+
+# evaluations, scored from player 1's point of view
+def evaluate_large(state):
+    return state.board.get_block_diff()
+
+def evaluate_corner(state):
+    return state.board.get_corner_diff()
+
+def evaluate_combo(state):
+    return state.board.get_block_diff() + state.board.get_corner_diff()
+
+# move ordering keys for a list of moves, scored from the moving player's point of view
+def size_keys(state, moves):
+    values = state.move_table.values
+    return [values[move >> piece_shift] for move in moves]
+
+def corner_keys(state, moves):
+    return [corner_diff for corner_diff, size in state.board.score_moves(moves, state.move_table, state.current_player)]
+
+def combo_keys(state, moves):
+    values = state.move_table.values
+    scores = state.board.score_moves(moves, state.move_table, state.current_player)
+    return [values[move >> piece_shift] + corner_diff for move, (corner_diff, size) in zip(moves, scores)]
+
+
+# What search and the greedy strategies score positions and moves with:
+# evaluate scores a position from player 1's point of view, and move_keys
+# scores a list of moves from the moving player's point of view, higher first.
+class Evaluator:
+    def __init__(self, evaluate, move_keys):
+        self.evaluate = evaluate
+        self.move_keys = move_keys
+
+
+# Base of the trackers that follow the moves a game state applies and
+# undoes. It keeps its own masks of each player's squares, so it works with
+# any board, and a history of what each move replaced so undoing a move
+# just restores it. Search may set a tracker up at a leaf, so moves from
+# before then are undone in full and everything is recomputed. Subclasses
+# say what to save and restore and how to recompute it all.
+class IncrementalTracker:
+    
+    def __init__(self, state):
+        self.state = state
+        board = state.board
+        self.grid = BitBoard(board.dim, board.starts)
+        if not isinstance(board, BitBoard):
+            board = BitBoard.from_board(board)
+        self.owned = dict(board.owned)
+        self.occupied = board.occupied
+        self.move_table = state.move_table
+        self.masks = state.move_table.get_masks()
+        self.history = []
+        self.refresh()
+    
+    # saves what a move by a player replaces and adds its squares, returns
+    # the mask of the squares or None for a pass
+    def place(self, player, move):
+        self.history.append((player, self.owned[player], self.occupied, self.save()))
+        if move is None:
+            return None
+        mask = self.masks[move >> move_shift][move & cell_mask]
+        self.owned[player] |= mask
+        self.occupied |= mask
+        return mask
+    
+    # takes back a move, including moves made before the tracker was set up
+    def undo(self, player, move):
+        if self.history:
+            player, owned, self.occupied, saved = self.history.pop()
+            self.owned[player] = owned
+            self.restore(saved)
+            return
+        if move is not None:
+            mask = self.masks[move >> move_shift][move & cell_mask]
+            self.owned[player] &= ~mask
+            self.occupied &= ~mask
+        self.refresh()
+
+
+# Features of each player the boards do not keep themselves, kept up to
+# date as a game state applies and undoes moves:
+#   reach     empty squares the player may still cover within two king
+#             steps of its anchors (corners not next to its own squares)
+#   mobility  anchors times pieces left, a cheap stand-in for the moves
+# Applying a move recomputes, with a few mask operations, only the players
+# whose reach the piece lands on.
+class FeatureTracker(IncrementalTracker):
+    
+    names = ("reach", "mobility")
+    
+    # recomputes the features of each player, and the squares where a piece changes them
+    def refresh(self):
+        self.features = {}
+        self.regions = {}
+        for player in self.owned:
+            self.update(player)
+    
+    def save(self):
+        return dict(self.features), dict(self.regions)
+    
+    def restore(self, saved):
+        self.features, self.regions = saved
+    
+    # gets the features of a player with the given squares, and the squares where a piece changes them
+    def measure(self, player, own, occupied, first_move, pieces_left):
+        grid = self.grid
+        empty = grid.board_mask & ~occupied
+        open_squares = empty & ~grid.edges(own)
+        anchors = grid.diagonals(own) & open_squares
+        if first_move:
+            anchors |= grid.start[player] & empty
+        reach = anchors
+        for _ in range(2):
+            reach |= (grid.diagonals(reach) | grid.edges(reach)) & open_squares
+        return (reach.bit_count(), anchors.bit_count() * pieces_left), reach
+    
+    # recomputes the features of a player
+    def update(self, player):
+        self.features[player], self.regions[player] = self.measure(
+            player, self.owned[player], self.occupied, self.state.first_move[player], len(self.state.players[player])
+        )
+    
+    # gets the features a move by a player would give each player it changes, without playing it
+    def move_features(self, player, move):
+        mask = self.masks[move >> move_shift][move & cell_mask]
+        occupied = self.occupied | mask
+        pieces_left = len(self.state.players[player]) - 1
+        changed = {player: self.measure(player, self.owned[player] | mask, occupied, False, pieces_left)[0]}
+        for other, region in self.regions.items():
+            if other != player and mask & region:
+                changed[other] = self.measure(
+                    other, self.owned[other], occupied, self.state.first_move[other], len(self.state.players[other])
+                )[0]
+        return changed
+    
+    # follows a move, None for a pass, played by a player
+    def apply(self, player, move):
+        mask = self.place(player, move)
+        if mask is None:
+            self.update(player)
+            return
+        for other, region in self.regions.items():
+            if other == player or mask & region:
+                self.update(other)
+
+
+# Territory of each player: the empty squares it may still fill, found by
+# flood filling from its anchors through the squares it may play on (empty
+# and not sharing an edge with its own squares), stepping to diagonal
+# neighbours too since later pieces chain through corners. Each anchor
+# also gets the value of the largest remaining piece that fits on it, 0
+# for a dead corner boxed in by the opponent. A placement only
+# refills the areas next to the piece and rechecks the anchors within
+# reach of it; the rest is kept. Results are cached by position hash, so
+# positions seen before, in this search or an earlier one, cost nothing.
+class TerritoryAnalyzer(IncrementalTracker):
+    
+    names = ("territory", "room")
+    
+    # (area, areas, largest piece by anchor) of each player, by position hash
+    cache = {}
+    cache_size = 1 << 16
+    
+    # analyzes every player, unless the position was analyzed before
+    def refresh(self):
+        self.regions = self.lookup()
+        if self.regions is None:
+            self.store({player: self.analyze(player) for player in self.owned})
+    
+    def save(self):
+        return self.regions
+    
+    def restore(self, saved):
+        self.regions = saved
+    
+    def lookup(self):
+        return TerritoryAnalyzer.cache.get(self.state.hash)
+    
+    def store(self, regions):
+        if len(TerritoryAnalyzer.cache) >= TerritoryAnalyzer.cache_size:
+            TerritoryAnalyzer.cache.clear()
+        TerritoryAnalyzer.cache[self.state.hash] = regions
+        self.regions = regions
+    
+    # gets the squares sharing an edge or a corner with the squares of a mask
+    def neighbours(self, mask):
+        return self.grid.diagonals(mask) | self.grid.edges(mask)
+    
+    # gets the squares a player may play on and its anchors
+    def open_squares(self, player):
+        grid = self.grid
+        own = self.owned[player]
+        open_squares = grid.board_mask & ~(self.occupied | grid.edges(own))
+        anchors = grid.diagonals(own) & open_squares
+        if self.state.first_move[player]:
+            anchors |= grid.start[player] & open_squares
+        return open_squares, anchors
+    
+    # splits the squares reachable from the seeds into connected areas
+    def flood(self, seeds, open_squares):
+        areas = []
+        while seeds:
+            area = seeds & -seeds
+            while True:
+                grown = (area | self.neighbours(area)) & open_squares
+                if grown == area:
+                    break
+                area = grown
+            areas.append(area)
+            seeds &= ~area
+        return areas
+    
+    # gets the (value, name) of a player's remaining pieces, largest first
+    def pieces_by_value(self, player):
+        table = self.move_table
+        return sorted(((table.values[table.piece_index[name]], name) for name in self.state.players[player]), reverse=True)
+    
+    # gets the value of the largest of the pieces that fits on an anchor. A
+    # piece of n squares covering the anchor lies within n - 1 edge steps of
+    # it, so pieces larger than the open squares that close are skipped.
+    def largest_piece(self, pieces, anchor, open_squares):
+        near = anchor
+        counts = [1]
+        for _ in range(max(self.move_table.values) - 1):
+            near |= self.grid.edges(near) & open_squares
+            counts.append(near.bit_count())
+        x, y = divmod(anchor.bit_length() - 1, self.grid.width)
+        span = self.move_table.span
+        for value, piece_name in pieces:
+            if counts[value - 1] < value:
+                continue
+            for base, piece, cells in self.move_table.orientations[piece_name]:
+                placements = self.masks[base >> move_shift]
+                for i, j in cells:
+                    mask = placements[(x - i + 5) * span + y - j + 5]
+                    if mask is not None and mask & open_squares == mask:
+                        return value
+        return 0
+    
+    # analyzes a player from scratch
+    def analyze(self, player):
+        open_squares, anchors = self.open_squares(player)
+        areas = self.flood(anchors, open_squares)
+        pieces = self.pieces_by_value(player)
+        largest = {}
+        while anchors:
+            anchor = anchors & -anchors
+            largest[anchor] = self.largest_piece(pieces, anchor, open_squares)
+            anchors ^= anchor
+        return self.summarize(areas, largest)
+    
+    def summarize(self, areas, largest):
+        area = 0
+        for part in areas:
+            area |= part
+        return area, tuple(areas), largest
+    
+    # reanalyzes a player after the squares of changed stopped being open to
+    # it, refilling only the areas next to them and rechecking the anchors a
+    # piece on them could reach. The anchors whose largest piece had the
+    # value of a piece the player used up are rechecked as well.
+    def update(self, player, region, changed, used_value=None):
+        area, areas, largest = region
+        open_squares, anchors = self.open_squares(player)
+        zone = changed | self.neighbours(changed)
+        kept = [part for part in areas if not part & zone]
+        dirty = zone
+        for part in areas:
+            if part & zone:
+                dirty |= part
+        areas = kept + self.flood(anchors & dirty, open_squares)
+        
+        # pieces reach at most four squares from the anchor they cover
+        near = changed
+        for _ in range(4):
+            near |= self.neighbours(near)
+        pieces = self.pieces_by_value(player)
+        updated = {}
+        remaining = anchors
+        while remaining:
+            anchor = remaining & -remaining
+            value = largest.get(anchor)
+            if value is None or anchor & near or value == used_value:
+                value = self.largest_piece(pieces, anchor, open_squares)
+            updated[anchor] = value
+            remaining ^= anchor
+        return self.summarize(areas, updated)
+    
+    # follows a move, None for a pass, played by a player
+    def apply(self, player, move):
+        mask = self.place(player, move)
+        cached = self.lookup()
+        if cached is not None:
+            self.regions = cached
+            return
+        regions = dict(self.regions)
+        if move is None:
+            regions[player] = self.analyze(player)
+        else:
+            used_value = self.move_table.value(move)
+            for other, region in self.regions.items():
+                if other == player:
+                    regions[other] = self.update(other, region, mask | self.grid.edges(mask), used_value)
+                elif mask & region[0]:
+                    regions[other] = self.update(other, region, mask)
+        self.store(regions)
+    
+    # gets the number of squares a player may still fill
+    def territory(self, player):
+        return self.regions[player][0].bit_count()
+    
+    # gets the total value of the largest pieces that fit on a player's anchors
+    def room(self, player):
+        return sum(self.regions[player][2].values())
+    
+    # gets the (x, y) of a player's anchors where none of its pieces fit
+    def dead_anchors(self, player):
+        return [divmod(anchor.bit_length() - 1, self.grid.width) for anchor, value in self.regions[player][2].items() if value == 0]
+    
+    def features(self, player):
+        return self.territory(player), self.room(player)
+
+
+# A linear model over the blocks and corners every board keeps, the
+# features of FeatureTracker and those of TerritoryAnalyzer. A player's
+# score is the weighted sum of its features minus those of its opponents,
+# so evaluating a position is a dot product over features that are kept up
+# to date as moves are played. The tracker and the analyzer only run when
+# their features have weights. The default weights are those of the combo
+# evaluation, blocks plus corners.
+class LinearEvaluator:
+    
+    board_names = ("blocks", "corners")
+    names = board_names + FeatureTracker.names + TerritoryAnalyzer.names
+    default_weights = {"blocks": 1, "corners": 1, "reach": 0, "mobility": 0, "territory": 0, "room": 0}
+    
+    def __init__(self, weights=None):
+        weights = dict(self.default_weights, **(weights or {}))
+        if set(weights) != set(self.names):
+            raise ValueError(f"Unknown features: {', '.join(sorted(set(weights) - set(self.names)))}")
+        self.weights = weights
+        self.board_vector = [weights[name] for name in self.board_names]
+        self.tracker_vector = [weights[name] for name in FeatureTracker.names]
+        self.territory_vector = [weights[name] for name in TerritoryAnalyzer.names]
+        self.uses_tracker = any(self.tracker_vector)
+        self.uses_territory = any(self.territory_vector)
+    
+    # loads weights from a JSON file of feature names and weights
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+    
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.weights, f, indent=4)
+    
+    def dot(self, vector, values):
+        return sum(weight * value for weight, value in zip(vector, values))
+    
+    # gets the score of a player from the features of every player
+    def score(self, state, player):
+        board = state.board
+        blocks_weight, corners_weight = self.board_vector
+        total = 0
+        for other in state.players:
+            sign = 1 if other == player else -1
+            total += sign * (blocks_weight * board.get_num_blocks(other) + corners_weight * board.num_corners(other))
+        if self.uses_tracker:
+            for other, values in state.track_features().features.items():
+                sign = 1 if other == player else -1
+                total += sign * self.dot(self.tracker_vector, values)
+        if self.uses_territory:
+            territory = state.analyze_territory()
+            for other in territory.regions:
+                sign = 1 if other == player else -1
+                for weight, value in zip(self.territory_vector, territory.features(other)):
+                    total += sign * weight * value
+        return total
+    
+    def evaluate(self, state):
+        return self.score(state, 1)
+    
+    # scores each move by the change in the moving player's score. The
+    # changes in blocks and corners come from score_moves and those of the
+    # tracked features from the move's squares, so the moves are not played,
+    # unless territory has weights and they have to be analyzed.
+    def move_keys(self, state, moves):
+        player = state.current_player
+        if self.uses_territory:
+            before = self.score(state, player)
+            keys = []
+            for move in moves:
+                state.apply(move)
+                keys.append(self.score(state, player) - before)
+                state.undo()
+            return keys
+        
+        values = state.move_table.values
+        blocks_weight, corners_weight = self.board_vector
+        scores = state.board.score_moves(moves, state.move_table, player)
+        keys = [blocks_weight * values[move >> piece_shift] + corners_weight * corner_diff
+                for move, (corner_diff, size) in zip(moves, scores)]
+        if self.uses_tracker:
+            tracker = state.track_features()
+            for i, move in enumerate(moves):
+                for other, features in tracker.move_features(player, move).items():
+                    sign = 1 if other == player else -1
+                    keys[i] += sign * (self.dot(self.tracker_vector, features) - self.dot(self.tracker_vector, tracker.features[other]))
+        return keys
+
+# weights of the linear evaluation, read from BLOKUS_WEIGHTS or weights.json next to this file
+weights_path = os.environ.get("BLOKUS_WEIGHTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json"))
+
+linear_evaluator = LinearEvaluator.load(weights_path) if os.path.exists(weights_path) else LinearEvaluator()
+
+# evaluators of the greedy and minimax strategies, by name
+evaluators = {
+    "large": Evaluator(evaluate_large, size_keys),
+    "corner": Evaluator(evaluate_corner, corner_keys),
+    "combo": Evaluator(evaluate_combo, combo_keys),
+    "linear": linear_evaluator
+}
+
+
+# bound types of a transposition table score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Fixed size table of searched positions. Each bucket has a slot that keeps
+# the deepest search of a position and a slot that is always replaced.
+class TranspositionTable:
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.entries = [None] * (2 * size)
+        self.hits = 0
+        self.stores = 0
+    
+    # gets the (key, depth, score, bound, best move) entry for a position, or None
+    def probe(self, key):
+        index = 2 * (key % self.size)
+        for entry in (self.entries[index], self.entries[index + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        return None
+    
+    # stores the result of searching a position
+    def store(self, key, depth, score, bound, move):
+        index = 2 * (key % self.size)
+        entry = (key, depth, score, bound, move)
+        deepest = self.entries[index]
+        if deepest is None or deepest[0] == key or depth >= deepest[1]:
+            self.entries[index] = entry
+        else:
+            self.entries[index + 1] = entry
+        self.stores += 1
+    
+    def clear(self):
+        self.entries = [None] * (2 * self.size)
+        self.hits = 0
+        self.stores = 0
+
+
+# splits the options of a strategy, such as "200ms,workers=4", into the
+# budget and a dict of integer settings
+def parse_options(options):
+    budget = ""
+    settings = {}
+    for option in options.split(","):
+        if "=" in option:
+            name, _, value = option.partition("=")
+            try:
+                settings[name] = int(value)
+            except ValueError:
+                raise ValueError(f"Invalid strategy option: {option}")
+        elif option:
+            budget = option
+    return budget, settings
+
+# raised inside a search when its time or node budget runs out
+class SearchTimeout(Exception):
+    pass
+
+# parses a search budget such as "200ms", "2s" or "5000n" (nodes)
+# into a time limit in seconds and a node limit
+def parse_budget(budget):
+    try:
+        if budget.endswith("ms"):
+            return float(budget[:-2]) / 1000, None
+        if budget.endswith("s"):
+            return float(budget[:-1]), None
+        if budget.endswith("n"):
+            return None, int(budget[:-1])
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid search budget: {budget}")
+
+
+# Alpha-beta search over a GameState. Player 1 maximizes the evaluation and
+# player 2 minimizes it. The transposition table or principal variation
+# move is searched first. One ply from the leaves the rest follow by their
+# static key, which is the change in the evaluation there. Deeper, the moves
+# that caused the last cutoffs at the same ply (killer moves) come next,
+# then the rest by static key plus history (how much each move, keyed by
+# piece, orientation and square, has caused cutoffs). A window, when set,
+# forward prunes the moves whose key is more than the window below the best
+# key. With reductions, late moves are searched one ply shallower first and
+# only searched in full if they turn out better than the best so far.
+class AlphaBeta:
+    def __init__(self, evaluator, window=None, table=None, killers=True, history=True, reductions=False):
+        self.evaluator = evaluator
+        self.window = window
+        self.table = table
+        self.use_killers = killers
+        self.use_history = history
+        self.reductions = reductions
+        self.nodes = 0
+        
+        # moves dropped by the window, and late moves reduced and searched again
+        self.pruned = 0
+        self.reduced = 0
+        self.researched = 0
+        
+        # two killer moves per ply, and cutoff scores per player and move
+        self.killers = []
+        self.history = {1: {}, 2: {}}
+        
+        # set by iterative_search while a budget applies
+        self.deadline = None
+        self.node_limit = None
+        self.pv_move = None
+        
+        # whether the last search stopped anywhere because of its depth
+        self.depth_limited = False
+        
+        # copies with other pruning policies, keyed by window and reductions
+        self.variants = {}
+    
+    # gets a search like this one with another window (None for no forward
+    # pruning) and reductions, it has its own table since its scores differ
+    def variant(self, window, reductions=False):
+        if (window, reductions) == (self.window, self.reductions):
+            return self
+        if (window, reductions) not in self.variants:
+            table = None if self.table is None else TranspositionTable(self.table.size)
+            self.variants[window, reductions] = AlphaBeta(
+                self.evaluator, window, table, self.use_killers, self.use_history, reductions
+            )
+        return self.variants[window, reductions]
+    
+    # forgets the killer moves and halves the history before searching a new position
+    def new_search(self):
+        self.killers = []
+        for history in self.history.values():
+            for move in history:
+                history[move] >>= 1
+    
+    # forgets everything earlier searches learned: the table, killers, history and variants
+    def reset(self):
+        if self.table is not None:
+            self.table.clear()
+        self.killers = []
+        self.history = {1: {}, 2: {}}
+        self.variants = {}
+    
+    # sorts the moves for a search to the given depth, dropping the ones outside
+    # the window. With two or more plies left the killers go first and the
+    # history is scaled so the move with the most cutoffs gains one key point.
+    def order_moves(self, state, moves, ply=0, depth=0):
+        keyed = list(zip(self.evaluator.move_keys(state, moves), moves))
+        if self.window is not None:
+            best_key = max(key for key, move in keyed)
+            kept = [(key, move) for key, move in keyed if key >= best_key - self.window]
+            self.pruned += len(keyed) - len(kept)
+            keyed = kept
+        if depth < 2:
+            keyed.sort(key=lambda x: x[0], reverse=True)
+        else:
+            killers = self.killers[ply] if self.use_killers and ply < len(self.killers) else ()
+            history = self.history[state.current_player] if self.use_history else {}
+            top = max((history.get(move, 0) for key, move in keyed), default=0) or 1
+            keyed.sort(key=lambda x: (x[1] in killers, x[0] + history.get(x[1], 0) / top), reverse=True)
+        return [move for key, move in keyed]
+    
+    # remembers a move that caused a cutoff
+    def record_cutoff(self, state, move, depth, ply):
+        if self.use_killers:
+            while len(self.killers) <= ply:
+                self.killers.append([])
+            killers = self.killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+        if self.use_history:
+            history = self.history[state.current_player]
+            history[move] = history.get(move, 0) + depth * depth
+    
+    # searches the state to the given depth, returns the score and best move
+    def search(self, state, depth, alpha=float('-inf'), beta=float('inf'), ply=0):
+        self.nodes += 1
+        
+        # check the budget at every node, on large boards a node can take milliseconds
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout()
+        
+        if state.is_over():
+            return self.evaluator.evaluate(state), None
+        if depth == 0:
+            self.depth_limited = True
+            return self.evaluator.evaluate(state), None
+        
+        valid_moves = state.get_valid_moves()
+        
+        # a player without moves passes, which does not use up depth
+        if not valid_moves:
+            state.apply(None)
+            value, _ = self.search(state, depth, alpha, beta, ply + 1)
+            state.undo()
+            return value, None
+        
+        # reuse an earlier search of this position, the root always searches for a move
+        alpha_start, beta_start = alpha, beta
+        hash_move = None
+        if self.table is not None:
+            entry = self.table.probe(state.hash)
+            if entry is not None:
+                _, entry_depth, score, bound, hash_move = entry
+                if ply > 0 and entry_depth >= depth:
+                    
+                    # the stored search may have stopped at its depth
+                    self.depth_limited = True
+                    if bound == EXACT:
+                        return score, hash_move
+                    if bound == LOWER:
+                        alpha = max(alpha, score)
+                    else:
+                        beta = min(beta, score)
+                    if beta <= alpha:
+                        return score, hash_move
+        
+        # the root searches the previous iteration's best move first
+        if ply == 0 and hash_move is None:
+            hash_move = self.pv_move
+        
+        maximizing_player = state.current_player == 1
+        best_eval = float('-inf') if maximizing_player else float('inf')
+        best_move = None
+        
+        # the hash move first, then the rest in order
+        ordered_moves = self.order_moves(state, valid_moves, ply, depth)
+        if hash_move in ordered_moves:
+            ordered_moves.remove(hash_move)
+            ordered_moves.insert(0, hash_move)
+        
+        for index, move in enumerate(ordered_moves):
+            state.apply(move)
+            
+            # late moves get a shallower search first, and a full one only if they look better
+            if self.reductions and depth >= 3 and index >= 3:
+                self.reduced += 1
+                eval, _ = self.search(state, depth - 2, alpha, beta, ply + 1)
+                if (eval > alpha) if maximizing_player else (eval < beta):
+                    self.researched += 1
+                    eval, _ = self.search(state, depth - 1, alpha, beta, ply + 1)
+            else:
+                eval, _ = self.search(state, depth - 1, alpha, beta, ply + 1)
+            state.undo()
+            
+            if maximizing_player:
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
+                alpha = max(alpha, eval)
+            else:
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
+                beta = min(beta, eval)
+            
+            # Alpha-beta pruning
+            if beta <= alpha:
+                self.record_cutoff(state, move, depth, ply)
+                break
+        
+        if self.table is not None:
+            if best_eval <= alpha_start:
+                bound = UPPER
+            elif best_eval >= beta_start:
+                bound = LOWER
+            else:
+                bound = EXACT
+            self.table.store(state.hash, depth, best_eval, bound, best_move)
+        
+        return best_eval, best_move
+    
+    # Searches one ply deeper at a time until the time or node budget runs
+    # out, and returns the score, best move and depth of the deepest search
+    # that finished. The first ply is always searched in full.
+    def iterative_search(self, state, max_depth=64, time_limit=None, node_limit=None):
+        start_time = time.perf_counter()
+        start_nodes = self.nodes
+        history_length = len(state.history)
+        result = (None, None, 0)
+        self.pv_move = None
+        self.new_search()
+
+        try:
+            for depth in range(1, max_depth + 1):
+                self.depth_limited = False
+                score, move = self.search(state, depth)
+                result = (score, move, depth)
+                self.pv_move = move
+                
+                # the whole game tree fit within this depth
+                if not self.depth_limited:
+                    break
+                
+                # the next depth takes longer than all the ones before it, so it
+                # is not started once half the time is gone, or all of it after depth 1
+                if time_limit is not None and time.perf_counter() - start_time >= time_limit / 2:
+                    break
+                
+                if depth == 1:
+                    if time_limit is not None:
+                        self.deadline = start_time + time_limit
+                    if node_limit is not None:
+                        self.node_limit = start_nodes + node_limit
+        except SearchTimeout:
+            
+            # take back the moves of the unfinished search
+            while len(state.history) > history_length:
+                state.undo()
+        finally:
+            self.deadline = None
+            self.node_limit = None
+            self.pv_move = None
+        
+        return result
+
+
+# the minimax strategies, each an evaluation with a move ordering
+minimax_large = AlphaBeta(evaluators["large"], window=2, table=TranspositionTable())
+minimax_corner = AlphaBeta(evaluators["corner"], window=2, table=TranspositionTable())
+minimax_combo = AlphaBeta(evaluators["combo"], window=4, table=TranspositionTable())
+minimax_linear = AlphaBeta(evaluators["linear"], window=4, table=TranspositionTable())
+
+minimax_searches = {
+    "large": minimax_large,
+    "corner": minimax_corner,
+    "combo": minimax_combo,
+    "linear": minimax_linear
+}
+
+# forgets what the searches of this process learned in earlier games, so a
+# game plays, and takes as long, the same whatever was played before it
+def reset_searches():
+    for engine in minimax_searches.values():
+        engine.reset()
+    TerritoryAnalyzer.cache.clear()
+
+# gets the search of a minimax strategy with the pruning policy of its
+# settings: "window=N" forward prunes with a window of N (-1 for none) and
+# "lmr=1" turns on late move reductions
+def get_minimax_engine(strategy, settings):
+    engine = minimax_searches[strategy]
+    window = settings.get("window", -1 if engine.window is None else engine.window)
+    return engine.variant(None if window < 0 else window, settings.get("lmr", 0) == 1)
+
+
+# gets the winner of a finished game from the pieces left, the player with
+# the least left, or 0 for a tie
+def get_winner(state):
+    return winner_of(remaining_values(state.pieces, state.players))
+
+# gets the value of the pieces each player has left
+def remaining_values(piece_set, players):
+    return {player: sum(piece_set[piece]["value"] for piece in names) for player, names in players.items()}
+
+# gets the player with the least left, or 0 if several players share it
+def winner_of(remaining):
+    least = min(remaining.values())
+    leaders = [player for player, value in remaining.items() if value == least]
+    return leaders[0] if len(leaders) == 1 else 0
+
+
+# A node of the Monte Carlo search tree, reached by player making move
+class MCTSNode:
+    __slots__ = ("move", "player", "parent", "children", "untried", "visits", "wins", "hash")
+    
+    def __init__(self, move, player, parent):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = []
+        
+        # moves not expanded yet, largest pieces last, filled in on the first visit
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+        self.hash = None
+
+
+# Monte Carlo tree search with UCT selection. A node gains a new child only
+# while it has fewer than widening * sqrt(visits) children, largest pieces
+# first, so wide nodes are widened as they are proven worth it. Rollouts play
+# the "large" or "random" policy to the end of the game. The tree is kept
+# between moves and advanced past the moves played, so the subtree of the
+# position reached is reused. With a batch, each leaf plays that many
+# rollouts at once with BatchGames and counts for as many playouts.
+class MCTS:
+    def __init__(self, rollout="large", exploration=1.4, widening=2.0, batch=1):
+        self.rollout_policy = rollout
+        self.exploration = exploration
+        self.widening = widening
+        self.root = None
+        
+        # playouts per leaf, more than one plays them together with BatchGames
+        self.batch = batch
+        
+        # playouts and time spent on them, over all searches and for the last one
+        self.playouts = 0
+        self.playout_time = 0.0
+        self.last_playouts = 0
+        self.last_time = 0.0
+    
+    # moves the root past a move played in the game, dropping the tree if it was not explored
+    def advance(self, move):
+        if self.root is None:
+            return
+        for child in self.root.children:
+            if child.move == move:
+                child.parent = None
+                self.root = child
+                return
+        self.root = None
+    
+    # gets the moves of a new node, or a pass if the side to move is stuck
+    def expand_moves(self, state):
+        moves = list(state.get_valid_moves())
+        if not moves:
+            return [None]
+        random.shuffle(moves)
+        moves.sort(key=state.move_table.value)
+        return moves
+    
+    # picks the child with the best upper confidence bound
+    def select_child(self, node):
+        log_visits = math.log(node.visits)
+        best_score = float('-inf')
+        best_child = None
+        for child in node.children:
+            score = child.wins / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best_score = score
+                best_child = child
+        return best_child
+    
+    # picks a rollout move: a random move, or a random move of the largest piece that fits
+    def rollout_move(self, state):
+        player = state.current_player
+        if state.cannot_move[player]:
+            return None
+        if self.rollout_policy == "random":
+            moves = state.get_valid_moves()
+            return random.choice(moves) if moves else None
+        
+        # only generate moves for the largest pieces that have any
+        by_value = {}
+        for piece_name in state.players[player]:
+            by_value.setdefault(state.pieces[piece_name]["value"], []).append(piece_name)
+        for value in sorted(by_value, reverse=True):
+            moves = state.board.get_valid_moves(by_value[value], state.move_table, player, state.first_move[player])
+            if moves:
+                return random.choice(moves)
+        return None
+    
+    # plays the game out from the state and takes the moves back, returns the winner
+    def rollout(self, state):
+        history_length = len(state.history)
+        while not state.is_over():
+            state.apply(self.rollout_move(state))
+        winner = get_winner(state)
+        while len(state.history) > history_length:
+            state.undo()
+        return winner
+    
+    # plays a batch of games out from the state at once, returns how many each player won, 0 for ties
+    def batch_rollout(self, state):
+        games = BatchGames.from_position(Position.from_state(state), self.batch, random.getrandbits(32))
+        winners = games.play([self.rollout_policy] * len(state.players))
+        return np.bincount(winners, minlength=len(state.players) + 1).tolist()
+    
+    # runs playouts from the state until the iteration or time budget runs out,
+    # returns the most visited move
+    def search(self, state, iterations=None, time_limit=None):
+        # keep the tree if advance reached this position, its nodes know their hashes
+        if self.root is None or self.root.hash != state.hash:
+            self.root = MCTSNode(None, previous_player(state.current_player, len(state.players)), None)
+            self.root.hash = state.hash
+        root = self.root
+        
+        start_time = time.perf_counter()
+        history_length = len(state.history)
+        playouts = 0
+        while True:
+            if iterations is not None and playouts >= iterations:
+                break
+            if time_limit is not None and time.perf_counter() - start_time > time_limit:
+                break
+            
+            # selection and expansion
+            node = root
+            while not state.is_over():
+                if node.untried is None:
+                    node.untried = self.expand_moves(state)
+                if node.untried and len(node.children) < max(1, self.widening * math.sqrt(node.visits)):
+                    move = node.untried.pop()
+                    child = MCTSNode(move, state.current_player, node)
+                    node.children.append(child)
+                    state.apply(move)
+                    child.hash = state.hash
+                    node = child
+                    break
+                node = self.select_child(node)
+                state.apply(node.move)
+            
+            if self.batch > 1:
+                wins = self.batch_rollout(state)
+            else:
+                wins = [0] * (len(state.players) + 1)
+                wins[self.rollout(state)] = 1
+            while len(state.history) > history_length:
+                state.undo()
+            
+            # back up the results, a tie counts as half a win
+            while node is not None:
+                node.visits += self.batch
+                node.wins += wins[node.player] + 0.5 * wins[0]
+                node = node.parent
+            playouts += self.batch
+        
+        self.last_playouts = playouts
+        self.last_time = time.perf_counter() - start_time
+        self.playouts += playouts
+        self.playout_time += self.last_time
+        
+        if not root.children:
+            return None
+        return max(root.children, key=lambda child: child.visits).move
+    
+    # gets the playouts per second of the last search
+    def playouts_per_second(self):
+        return self.last_playouts / self.last_time if self.last_time > 0 else 0.0
+
+
+# playouts per move for MCTS strategies without a budget
+mcts_iterations = 300
+
+
+# gets the final score of a finished game from player 1's point of view,
+# the value of player 2's pieces left minus the value of player 1's
+def final_score(state):
+    p1_pieces = sum(state.pieces[piece]["value"] for piece in state.players[1])
+    p2_pieces = sum(state.pieces[piece]["value"] for piece in state.players[2])
+    return p2_pieces - p1_pieces
+
+# Solves positions near the end of the game exactly: alpha-beta to the end
+# of the game, scored like play_game by the value of the pieces left, with
+# the results memoized by position hash. It switches on once few pieces are
+# left or the side to move has few moves, and gives up on positions that
+# take more than node_limit nodes. The counters record how often it was
+# used and what it cost.
+class EndgameSolver:
+    def __init__(self, max_pieces=6, max_moves=8, node_limit=200000):
+        self.max_pieces = max_pieces
+        self.max_moves = max_moves
+        self.node_limit = node_limit
+        
+        # hash -> (score, bound, best move)
+        self.memo = {}
+        
+        self.activations = 0
+        self.solved = 0
+        self.aborted = 0
+        self.nodes = 0
+        self.memo_hits = 0
+        self.time = 0.0
+        
+        # node count at which the current solve gives up
+        self.limit = 0
+    
+    # whether a position is small enough to solve, given its moves
+    def should_solve(self, state, moves, max_pieces=None):
+        if max_pieces is None:
+            max_pieces = self.max_pieces
+        remaining = sum(len(names) for names in state.players.values())
+        return remaining <= max_pieces or len(moves) <= self.max_moves
+    
+    # gets the exact score and best move of a position, or None if it took too many nodes
+    def solve(self, state):
+        self.activations += 1
+        start_time = time.perf_counter()
+        self.limit = self.nodes + self.node_limit
+        history_length = len(state.history)
+        try:
+            result = self.search(state, float('-inf'), float('inf'))
+            self.solved += 1
+        except SearchTimeout:
+            while len(state.history) > history_length:
+                state.undo()
+            self.aborted += 1
+            result = None
+        self.time += time.perf_counter() - start_time
+        return result
+    
+    def search(self, state, alpha, beta):
+        self.nodes += 1
+        if self.nodes > self.limit:
+            raise SearchTimeout()
+        
+        if state.is_over():
+            return final_score(state), None
+        
+        key = state.hash
+        alpha_start, beta_start = alpha, beta
+        entry = self.memo.get(key)
+        best_first = None
+        if entry is not None:
+            self.memo_hits += 1
+            score, bound, best_first = entry
+            if bound == EXACT:
+                return score, best_first
+            if bound == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if beta <= alpha:
+                return score, best_first
+        
+        valid_moves = state.get_valid_moves()
+        if not valid_moves:
+            state.apply(None)
+            score, _ = self.search(state, alpha, beta)
+            state.undo()
+            self.memo[key] = (score, EXACT if alpha_start < score < beta_start else (UPPER if score <= alpha_start else LOWER), None)
+            return score, None
+        
+        # large pieces first, and the best move found before
+        valid_moves = sorted(valid_moves, key=state.move_table.value, reverse=True)
+        if best_first in valid_moves:
+            valid_moves.remove(best_first)
+            valid_moves.insert(0, best_first)
+        
+        maximizing_player = state.current_player == 1
+        best_score = float('-inf') if maximizing_player else float('inf')
+        best_move = None
+        for move in valid_moves:
+            state.apply(move)
+            score, _ = self.search(state, alpha, beta)
+            state.undo()
+            if maximizing_player:
+                if score > best_score:
+                    best_score, best_move = score, move
+                alpha = max(alpha, score)
+            else:
+                if score < best_score:
+                    best_score, best_move = score, move
+                beta = min(beta, score)
+            if beta <= alpha:
+                break
+        
+        if best_score <= alpha_start:
+            bound = UPPER
+        elif best_score >= beta_start:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.memo[key] = (best_score, bound, best_move)
+        return best_score, best_move
+    
+    # gets the counters as a dict
+    def stats(self):
+        return {
+            "activations": self.activations,
+            "solved": self.solved,
+            "aborted": self.aborted,
+            "nodes": self.nodes,
+            "memo_hits": self.memo_hits,
+            "time": round(self.time, 6)
+        }
+
+
+# gets the same placement mirrored across the main diagonal, as a move of one of the piece's orientations
+def transpose_move(move_table, move):
+    piece_name, piece, x, y, ori = move_table.decode(move)
+    squares = sorted((y + j, x + i) for i, j in shape_cells(piece))
+    for base, shape, cells in move_table.orientations[piece_name]:
+        ordered = sorted(cells)
+        dx, dy = squares[0][0] - ordered[0][0], squares[0][1] - ordered[0][1]
+        if all((cx + dx, cy + dy) == square for (cx, cy), square in zip(ordered, squares)):
+            return base | (dx + 5) * move_table.span + dy + 5
+
+
+# Opening moves looked up by position. A position is keyed by the smaller
+# of its hash and the hash of its mirror image across the main diagonal,
+# which keeps both starting corners in place, so mirrored positions share
+# one entry. The book file is a header followed by fixed size records
+# (key, piece index, orientation index, x, y, score) sorted by key.
+class OpeningBook:
+    
+    magic = b"BLKB"
+    header = struct.Struct("<4sI")
+    record = struct.Struct("<QBBbbh")
+    
+    def __init__(self):
+        
+        # key -> (piece name, orientation, x, y, score), in the frame of the smaller hash
+        self.entries = {}
+        self.lookups = 0
+        self.hits = 0
+    
+    # gets the key of a position and whether it is the mirrored position's hash
+    @staticmethod
+    def canonical_key(state):
+        board = state.board
+        keys = zobrist_square_keys(board.dim)
+        mirrored = zobrist_key("board", board.dim)
+        for x in range(board.dim):
+            for y in range(board.dim):
+                player = board.get_square(x, y)
+                if player > 0:
+                    mirrored ^= keys[player][y][x]
+        mirrored ^= state.key
+        if mirrored < state.hash:
+            return mirrored, True
+        return state.hash, False
+    
+    # adds the best move of a position
+    def add(self, state, move, score):
+        key, mirrored = self.canonical_key(state)
+        if mirrored:
+            move = transpose_move(state.move_table, move)
+        piece_name, piece, x, y, ori = state.move_table.decode(move)
+        self.entries[key] = (piece_name, ori, x, y, score)
+    
+    def __contains__(self, state):
+        return self.canonical_key(state)[0] in self.entries
+    
+    # gets the book move of a position, or None if it is not in the book
+    def lookup(self, state):
+        self.lookups += 1
+        key, mirrored = self.canonical_key(state)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        piece_name, ori, x, y, score = entry
+        move = state.move_table.encode(piece_name, ori, x, y)
+        if mirrored:
+            move = transpose_move(state.move_table, move)
+        return move
+    
+    def save(self, path, piece_set):
+        piece_names = list(piece_set)
+        with open(path, "wb") as f:
+            f.write(self.header.pack(self.magic, len(self.entries)))
+            for key in sorted(self.entries):
+                piece_name, ori, x, y, score = self.entries[key]
+                f.write(self.record.pack(key, piece_names.index(piece_name), orientation_names.index(ori), x, y, score))
+    
+    @classmethod
+    def load(cls, path, piece_set):
+        piece_names = list(piece_set)
+        book = cls()
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, count = cls.header.unpack_from(data)
+        if magic != cls.magic:
+            raise ValueError(f"{path} is not an opening book")
+        for key, piece, ori, x, y, score in cls.record.iter_unpack(data[cls.header.size:cls.header.size + count * cls.record.size]):
+            book.entries[key] = (piece_names[piece], orientation_names[ori], x, y, score)
+        return book
+
+
+# opening books loaded so far, keyed by path
+opening_books = {}
+
+# loads an opening book once, later calls share it
+def load_opening_book(path, piece_set=pieces):
+    if path not in opening_books:
+        opening_books[path] = OpeningBook.load(path, piece_set)
+    return opening_books[path]
+
+
+# Parallel search. Root moves, or whole MCTS trees, are searched by a pool of
+# worker processes. Workers get the position as a Position and rebuild it on
+# a BitBoard. Moves are ints that mean the same in every process.
+
+# best root score found so far, shared by the workers of a pool
+search_bound = None
+
+# pools of worker processes and their shared bound, keyed by number of workers
+search_pools = {}
+
+def init_search_worker(bound):
+    global search_bound
+    search_bound = bound
+
+# gets the pool of worker processes for parallel search, started on first use
+def get_search_pool(workers):
+    if workers not in search_pools:
+        bound = multiprocessing.Value("d", 0.0)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_search_worker, initargs=(bound,))
+        search_pools[workers] = (executor, bound)
+    return search_pools[workers]
+
+# searches one root move in a worker and shares its score if it is the best so far
+def search_root_move(position, strategy, settings, move, depth):
+    engine = get_minimax_engine(strategy, settings)
+    state = position.to_state()
+    maximizing_player = state.current_player == 1
+    
+    # the scores are integers, so a window one past the best score so far
+    # still gives the exact score of every move that ties it
+    bound = search_bound.value
+    state.apply(move)
+    if maximizing_player:
+        score, _ = engine.search(state, depth - 1, bound - 1, float('inf'), ply=1)
+    else:
+        score, _ = engine.search(state, depth - 1, float('-inf'), bound + 1, ply=1)
+    
+    with search_bound.get_lock():
+        if (score > search_bound.value) if maximizing_player else (score < search_bound.value):
+            search_bound.value = score
+    return score
+
+# Searches the root moves of a state to a fixed depth on several processes.
+# The first move is searched here to get a bound, then the rest go to the
+# workers (Young Brothers Wait), which start from the best score found so
+# far. The lowest ordered move with the best score wins, so the result does
+# not depend on the order the workers finish in.
+def parallel_minimax(state, strategy, depth, workers, settings=None):
+    settings = settings or {}
+    engine = get_minimax_engine(strategy, settings)
+    engine.new_search()
+    valid_moves = state.get_valid_moves()
+    if not valid_moves:
+        return None, None
+    ordered_moves = engine.order_moves(state, valid_moves, 0, depth)
+    
+    state.apply(ordered_moves[0])
+    first_score, _ = engine.search(state, depth - 1, ply=1)
+    state.undo()
+    
+    executor, bound = get_search_pool(workers)
+    bound.value = first_score
+    position = Position.from_state(state)
+    futures = [
+        executor.submit(search_root_move, position, strategy, settings, move, depth)
+        for move in ordered_moves[1:]
+    ]
+    scores = [first_score] + [future.result() for future in futures]
+    
+    best_score = max(scores) if state.current_player == 1 else min(scores)
+    return best_score, ordered_moves[scores.index(best_score)]
+
+# runs an MCTS search in a worker, returns the visits of each root move
+def search_mcts_tree(position, rollout, iterations, time_limit, seed, batch=1):
+    random.seed(seed)
+    tree = MCTS(rollout, batch=batch)
+    tree.search(position.to_state(), iterations, time_limit)
+    visits = {child.move: child.visits for child in tree.root.children}
+    return visits, tree.last_playouts
+
+# Runs independent MCTS trees on several processes, each with its own seed
+# drawn from the random module, and picks the move with the most visits
+# over all trees. With an iteration budget the result only depends on the
+# seed and the number of workers. Returns the move and the total playouts.
+def parallel_mcts(state, rollout, iterations, time_limit, workers, batch=1):
+    executor, _ = get_search_pool(workers)
+    position = Position.from_state(state)
+    futures = [
+        executor.submit(search_mcts_tree, position, rollout, iterations, time_limit, random.getrandbits(32), batch)
+        for _ in range(workers)
+    ]
+    
+    visits = {}
+    playouts = 0
+    for future in futures:
+        tree_visits, tree_playouts = future.result()
+        for key, count in tree_visits.items():
+            visits[key] = visits.get(key, 0) + count
+        playouts += tree_playouts
+    if not visits:
+        return None, playouts
+    
+    # break ties by the move itself so the order trees report in does not matter
+    best_move = max(sorted(visits), key=lambda move: visits[move])
+    return best_move, playouts
+
+
+# Precomputed tables. The orientation table of a piece set and the BitBoard
+# placement masks of its orientations only depend on the board size and the
+# pieces, they are built once per configuration and pickled to a file in
+# table_cache_dir so later runs and worker processes can load them.
+table_cache_dir = os.environ.get("BLOKUS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "blokus"))
+
+# bumped whenever the layout of the tables changes, so old files are not used
+table_version = 1
+
+# (board size, id of the piece set) of the tables loaded so far
+loaded_tables = set()
+
+# gets the file the tables of a board size and piece set are cached in
+def table_path(board_dim, piece_set):
+    shapes = [(piece_name, piece["shape"]) for piece_name, piece in piece_set.items()]
+    digest = hashlib.sha1(repr((table_version, board_dim, shapes)).encode()).hexdigest()[:16]
+    return os.path.join(table_cache_dir, f"tables-{board_dim}-{digest}.pickle")
+
+# builds the orientation table of a piece set and the placement masks of
+# each orientation, listed in the order of the table
+def build_tables(board_dim, piece_set):
+    table = get_orientations(piece_set)
+    board = BitBoard(board_dim)
+    masks = {
+        piece_name: [board.placement_masks(shape) for ori, shape, cells in entries]
+        for piece_name, entries in table.items()
     }
+    return table, masks
+
+# makes the tables of a board size and piece set ready, loading them from
+# the cache file or building them and writing the file
+def load_tables(board_dim, piece_set):
+    if (board_dim, id(piece_set)) in loaded_tables:
+        return
+    path = table_path(board_dim, piece_set)
+    tables = None
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                tables = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            tables = None
+    if tables is None:
+        tables = build_tables(board_dim, piece_set)
+        
+        # the cache only saves time, so a directory that can not be written is not an error
+        try:
+            os.makedirs(table_cache_dir, exist_ok=True)
+            partial = f"{path}.{os.getpid()}"
+            with open(partial, "wb") as f:
+                pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial, path)
+        except OSError:
+            pass
+    
+    # a piece set already in use keeps its table, the loaded masks are
+    # attached to its templates since both tables list orientations in the same order
+    table, masks = tables
+    if id(piece_set) not in orientation_cache:
+        orientation_cache[id(piece_set)] = (piece_set, table)
+    board_masks = BitBoard.mask_cache.setdefault(board_dim, {})
+    for piece_name, entries in get_orientations(piece_set).items():
+        for (ori, shape, cells), placements in zip(entries, masks[piece_name]):
+            if id(shape) not in board_masks:
+                board_masks[id(shape)] = (shape, placements)
+    loaded_tables.add((board_dim, id(piece_set)))
+
+
+# A board size, piece set and starting square of each player
+class GameConfig:
+    def __init__(self, board_dim, piece_set, starts=None, name=None):
+        self.board_dim = board_dim
+        self.pieces = piece_set
+        self.starts = tuple(starts or corner_starts(board_dim))
+        self.name = name or f"{board_dim}x{board_dim}"
+        
+        # sizes of the fields of a packed Position
+        self.piece_names = list(piece_set)
+        self.piece_index = {piece_name: i for i, piece_name in enumerate(self.piece_names)}
+        self.piece_bytes = (len(piece_set) + 7) // 8
+        self.board_bytes = (board_dim * (board_dim + 1) + 7) // 8
+        self.position_bytes = 2 + len(self.starts) * (self.piece_bytes + self.board_bytes)
+
+    @property
+    def num_players(self):
+        return len(self.starts)
+    
+    def load_tables(self):
+        load_tables(self.board_dim, self.pieces)
+    
+    def get_move_table(self):
+        self.load_tables()
+        return get_move_table(self.board_dim, self.pieces)
+    
+    # pickles by piece names when the pieces are a named set, so a pickled
+    # configuration is small and unpickles to the shared configuration
+    def __reduce__(self):
+        piece_names = tuple(self.piece_names)
+        if all(piece_name in polyominoes for piece_name in piece_names) and piece_set_from_names(piece_names) is self.pieces:
+            return config_from_names, (self.board_dim, piece_names, self.starts, self.name)
+        return GameConfig, (self.board_dim, self.pieces, self.starts, self.name)
+
+# configurations made so far, keyed by board size, id of the piece set and starting squares
+config_cache = {}
+
+# gets the configuration of a board size, piece set and starting squares, the same object every time
+def get_config(board_dim, piece_set, starts=None, name=None):
+    starts = tuple(starts or corner_starts(board_dim))
+    key = (board_dim, id(piece_set), starts)
+    if key not in config_cache:
+        config_cache[key] = GameConfig(board_dim, piece_set, starts, name)
+    return config_cache[key]
+
+def config_from_names(board_dim, piece_names, starts, name):
+    return get_config(board_dim, piece_set_from_names(piece_names), starts, name)
+
+# The default game, Blokus Duo (two players starting near the middle of a
+# 14x14 board) and standard four player Blokus on a 20x20 board
+game_configs = {
+    "classic": get_config(board_dimensions, pieces, name="classic"),
+    "duo": get_config(14, all_pieces, ((4, 4), (9, 9)), "duo"),
+    "standard": get_config(20, all_pieces, corner_starts(20, 4), "standard")
 }
 
-class Board:
-    def __init__(self, board_dim):
-        self.dim = board_dim
-        self.squares = [[0 for _ in range(board_dim)] for _ in range(board_dim)]
+
+# An immutable snapshot of a game packed into bytes: the side to move, a
+# byte of first move and cannot move flags, a bit for each piece every player
+# has left, and every player's squares as a BitBoard mask. A two player
+# position takes 22 bytes on the default board and 62 on the Duo board.
+# apply returns a new position, so positions can be kept, hashed and sent to
+# other processes as they are, and the bytes alone rebuild one with its
+# configuration.
+class Position:
+    __slots__ = ("config", "data")
     
-    # gets the number of blocks for a player
-    def get_num_blocks(self, player):
-        count = 0
-        for row in self.squares:
-            for cell in row:
-                if cell == player:
-                    count += 1
-        return count
+    def __init__(self, config, data):
+        object.__setattr__(self, "config", config)
+        object.__setattr__(self, "data", bytes(data))
     
-    # gets the block diff between the two players
-    def get_block_diff(self):
-        count = 0
-        for row in self.squares:
-            for cell in row:
-                if cell == 1:
-                    count += 1
-                elif cell == 2:
-                    count -= 1
-        return count
+    def __setattr__(self, name, value):
+        raise AttributeError("Position is immutable")
     
-    # determines whether a cell is a corner for a given player
-    def is_corner(self, x, y, player):
-        if self.get_square(x, y) != 0:
-            return False
-        corner_squares = [
-            [x - 1, y - 1],
-            [x - 1, y + 1],
-            [x + 1, y - 1],
-            [x + 1, y + 1]
-        ]
-        for corner in corner_squares:
-            if self.get_square(corner[0], corner[1]) == player:
-                return True
-        return False
+    # packs the fields of a position, the flags have a bit for each player
+    # still to make its first move and, four bits up, for each player that can not move
+    @classmethod
+    def pack(cls, config, current_player, flags, remaining, owned):
+        return cls(config, b"".join(
+            [bytes((current_player, flags))] +
+            [mask.to_bytes(config.piece_bytes, "little") for mask in remaining] +
+            [mask.to_bytes(config.board_bytes, "little") for mask in owned]
+        ))
+    
+    # gets the fields of the position: side to move, flags, and a mask of
+    # the pieces left and of the squares owned for each player
+    def unpack(self):
+        config, data = self.config, self.data
+        players = config.num_players
+        remaining = []
+        owned = []
+        offset = 2
+        for _ in range(players):
+            remaining.append(int.from_bytes(data[offset:offset + config.piece_bytes], "little"))
+            offset += config.piece_bytes
+        for _ in range(players):
+            owned.append(int.from_bytes(data[offset:offset + config.board_bytes], "little"))
+            offset += config.board_bytes
+        return data[0], data[1], remaining, owned
+    
+    # gets the position before the first move of a configuration
+    @classmethod
+    def initial(cls, config):
+        players = config.num_players
+        return cls.pack(config, 1, (1 << players) - 1, [(1 << len(config.pieces)) - 1] * players, [0] * players)
+    
+    # packs a game state, whatever board it is on
+    @classmethod
+    def from_state(cls, state):
+        board = state.board
+        config = get_config(board.dim, state.pieces, board.starts)
+        if not isinstance(board, BitBoard):
+            board = BitBoard.from_board(board)
+        flags = 0
+        remaining = []
+        for player in board.player_ids:
+            if state.first_move[player]:
+                flags |= 1 << (player - 1)
+            if state.cannot_move[player]:
+                flags |= 16 << (player - 1)
+            mask = 0
+            for piece_name in state.players[player]:
+                mask |= 1 << config.piece_index[piece_name]
+            remaining.append(mask)
+        owned = [board.owned[player] for player in board.player_ids]
+        return cls.pack(config, state.current_player, flags, remaining, owned)
+    
+    # rebuilds a position from its bytes
+    @classmethod
+    def from_bytes(cls, config, data):
+        return cls(config, data)
+    
+    def to_bytes(self):
+        return self.data
+    
+    @property
+    def current_player(self):
+        return self.data[0]
+    
+    def is_over(self):
+        return self.data[1] >> 4 == (1 << self.config.num_players) - 1
+    
+    # unpacks the position into a game state on a new BitBoard
+    def to_state(self):
+        config = self.config
+        config.load_tables()
+        current_player, flags, remaining, owned = self.unpack()
+        board = BitBoard(config.board_dim, config.starts)
+        for player, mask in zip(board.player_ids, owned):
+            board.owned[player] = mask
+            board.occupied |= mask
+            keys = board.keys[player]
+            while mask:
+                low = mask & -mask
+                x, y = divmod(low.bit_length() - 1, board.width)
+                board.hash ^= keys[x][y]
+                mask ^= low
+        board.update_masks()
+        players = {
+            player: [piece_name for i, piece_name in enumerate(config.piece_names) if mask >> i & 1]
+            for player, mask in zip(board.player_ids, remaining)
+        }
+        return GameState(
+            board,
+            config.pieces,
+            config.get_move_table(),
+            current_player,
+            players,
+            {player: flags >> (player - 1) & 1 == 1 for player in board.player_ids},
+            {player: flags >> (player + 3) & 1 == 1 for player in board.player_ids}
+        )
+    
+    # gets the position after the side to move plays a move, None passes
+    def apply(self, move):
+        config = self.config
+        player, flags, remaining, owned = self.unpack()
+        flags &= ~(1 << (player - 1))
+        if move is None:
+            flags |= 16 << (player - 1)
+        else:
+            owned[player - 1] |= config.get_move_table().get_masks()[move >> move_shift][move & cell_mask]
+            remaining[player - 1] &= ~(1 << (move >> piece_shift))
+        return Position.pack(config, next_player(player, config.num_players), flags, remaining, owned)
+    
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.config is other.config and self.data == other.data
+    
+    def __hash__(self):
+        return hash(self.data)
+    
+    def __reduce__(self):
+        return Position, (self.config, self.data)
+
+
+# The placements of a configuration laid out for BatchGames: every move that
+# fits on the board, most valuable pieces first, as bits of an array of 64
+# bit words. Each piece value starts a new word, so the placements of a
+# value are a range of words, and the bits left over in a word are padding
+# that is never set. A set of placements is a mask with their bits set: the
+# table has the mask of the placements covering each square, with a last
+# empty mask for padding, and of the placements of each piece.
+class PlacementTable:
+    def __init__(self, config):
+        dim = config.board_dim
+        move_table = config.get_move_table()
+        self.squares = dim * dim
+        by_value = {}
+        for piece_name in move_table.piece_names:
+            piece = move_table.piece_index[piece_name]
+            for base, shape, cells in move_table.orientations[piece_name]:
+                for x in range(-5, dim):
+                    for y in range(-5, dim):
+                        squares = {(x + i, y + j) for i, j in cells}
+                        if all(0 <= a < dim and 0 <= b < dim for a, b in squares):
+                            move = base | (x + 5) * move_table.span + y + 5
+                            by_value.setdefault(move_table.values[piece], []).append((move, piece, squares))
         
-    # gets the number of corners for a player    
-    def num_corners(self, player):
-        count = 0
-        for i in range(self.dim):
-            for j in range(self.dim):
-                if self.is_corner(i, j, player):
-                    count += 1
-        return count
+        # bit of each placement, -1 moves and pieces mark padding
+        moves, pieces, covered, edges, diagonals = [], [], [], [], []
+        self.tiers = []
+        for value in sorted(by_value, reverse=True):
+            self.tiers.append((value, len(moves) // 64))
+            placements = by_value[value]
+            placements += [(-1, -1, set())] * (-len(placements) % 64)
+            for move, piece, squares in placements:
+                next_to = {(a + da, b + db) for a, b in squares for da, db in ((-1, 0), (1, 0), (0, -1), (0, 1))}
+                diagonal = {(a + da, b + db) for a, b in squares for da, db in diagonal_offsets}
+                moves.append(move)
+                pieces.append(piece)
+                covered.append(square_list(dim, squares))
+                edges.append(square_list(dim, next_to - squares))
+                diagonals.append(square_list(dim, diagonal - squares - next_to))
+        self.words = len(moves) // 64
+        self.moves = np.array(moves, dtype=np.int32)
+        self.pieces = np.array(pieces, dtype=np.intp)
+        
+        # the squares each placement covers, is next to and is diagonal to, padded with the empty square
+        self.covered = pad_lists(covered, self.squares)
+        self.edges = pad_lists(edges, self.squares)
+        self.diagonals = pad_lists(diagonals, self.squares)
+        
+        # value of the placements of each word, and of each piece
+        self.word_values = np.repeat([value for value, word in self.tiers], np.diff([word for value, word in self.tiers] + [self.words]))
+        self.piece_values = np.array(move_table.values, dtype=np.int64)
+        
+        bits = np.zeros((self.squares + 1, self.words * 64), dtype=bool)
+        for placement, squares in enumerate(covered):
+            bits[squares, placement] = True
+        self.square_masks = pack_bits(bits)
+        self.piece_masks = pack_bits(np.arange(len(move_table.piece_names))[:, None] == self.pieces)
+        self.all_moves = pack_bits(self.pieces >= 0)
     
-    # Gets the corner diff between the two players
-    def get_corner_diff(self):
-        count = 0
-        for i in range(self.dim):
-            for j in range(self.dim):
-                if self.is_corner(i, j, 1):
-                    count += 1
-                if self.is_corner(i, j, 2):
-                    count -= 1
-        return count
+    # gets the mask of the placements covering any of a set of squares
+    def covering(self, squares):
+        return np.bitwise_or.reduce(self.square_masks[list(squares) + [self.squares]], axis=0)
+
+# gets the numbers of the squares of a set that are on the board
+def square_list(dim, squares):
+    return [x * dim + y for x, y in squares if 0 <= x < dim and 0 <= y < dim]
+
+# pads lists of ints to the same length, as an array
+def pad_lists(lists, fill):
+    width = max(len(items) for items in lists)
+    return np.array([items + [fill] * (width - len(items)) for items in lists], dtype=np.intp)
+
+# packs the last axis of a boolean array into 64 bit words, bit i of word j is item 64 * j + i
+def pack_bits(bits):
+    return np.packbits(bits, axis=-1, bitorder="little").view("<u8").astype(np.uint64)
+
+# placement tables made so far, keyed by configuration
+placement_tables = {}
+
+def get_placement_table(config):
+    if config not in placement_tables:
+        placement_tables[config] = PlacementTable(config)
+    return placement_tables[config]
+
+
+# Plays a batch of games of one configuration in lockstep, one row of each
+# array per game. Every game has the same side to move: a game whose player
+# is stuck passes and a finished game sits out the rest of the steps, so
+# one step moves every game at once. The policies are the rollout policies
+# of MCTS: "random" plays a random valid move and "large" a random valid
+# move of the largest piece that fits.
+#
+# Moves are not generated. Each player keeps a mask of the placements that
+# fit, that is cover no occupied square and no square next to its own
+# pieces and use a piece it has left, and a mask of the placements touching
+# one of its corners. Placing a piece clears the placements covering its
+# squares for everyone and the placements next to it and of its piece for
+# its player, and adds the placements covering its corners, so the valid
+# moves are the bits set in both masks. A move is picked by counting the
+# bits of each word and finding the chosen bit.
+class BatchGames:
     
-    # gets the value of a square
-    def get_square(self, x, y):
-        if 0 <= x < self.dim and 0 <= y < self.dim:
-            return self.squares[x][y]
-        return -1
+    policies = ("random", "large")
     
-    # determines if a piece can be placed at a given position
-    def is_move_valid(self, piece, x, y, ori, current_player, is_first_move):
+    def __init__(self, config, n, seed=None):
+        if np is None:
+            raise ImportError("BatchGames needs numpy")
+        self.config = config
+        self.n = n
+        self.table = get_placement_table(config)
+        self.rng = np.random.default_rng(seed)
+        players = config.num_players
         
-        touching_corner = False
+        # a player's starting square counts as a corner until the first move
+        dim = config.board_dim
+        self.fits = np.repeat(np.repeat(self.table.all_moves[None, None], players, axis=1), n, axis=0)
+        self.touches = np.zeros((n, players, self.table.words), dtype=np.uint64)
+        for index, (x, y) in enumerate(config.starts):
+            self.touches[:, index] = self.table.square_masks[x * dim + y]
         
-        # rotate the piece if needed
-        if ori == "right":
-            piece = [[piece[j][i] for j in range(len(piece) - 1, -1, -1)] for i in range(len(piece[0]))]
-        elif ori == "left":
-            piece = [[piece[j][i] for j in range(len(piece))] for i in range(len(piece[0]) - 1, -1, -1)]
-        elif ori == "down":
-            piece = [row[::-1] for row in piece[::-1]]
+        self.remaining = np.ones((n, players, len(config.pieces)), dtype=bool)
+        self.cannot_move = np.zeros((n, players), dtype=bool)
+        self.current_player = 1
         
-        # starting corner for each player
-        corner_x, corner_y = (0, 0) if current_player == 1 else (self.dim - 1, self.dim - 1)
+        # the move of every game at each step, -1 for a pass or a finished game,
+        # and the position the games started from, None for the empty board
+        self.moves = []
+        self.start = None
     
-        # iterate over the piece
-        for i in range(len(piece)):
-            for j in range(len(piece[0])):
-                
-                # ensure the piece is within the board bounds and the position is empty
-                if piece[i][j] == 1 and self.get_square(x + i, y + j) != 0:
-                    return False
-                
-            
-                # ensure the piece has a corner touching another piece of the same player
-                if piece[i][j] == 2 and self.get_square(x + i, y + j) == current_player:
-                    touching_corner = True
-            
-                # ensure the piece does not have a block touching another piece of the same player
-                if piece[i][j] == 3 and self.get_square(x + i, y + j) == current_player:
-                    return False
-                
-                # If its the first, move the piece must touch the starting corner
-                if (piece[i][j] == 1 and 
-                    is_first_move and
-                    (corner_x, corner_y) == (x + i, y + j)
-                ):
-                    touching_corner = True
+    # starts n games from a position
+    @classmethod
+    def from_position(cls, position, n, seed=None):
+        config = position.config
+        table = get_placement_table(config)
+        games = cls(config, n, seed)
+        current_player, flags, remaining, owned = position.unpack()
+        dim, width = config.board_dim, config.board_dim + 1
+        
+        # the squares of each player
+        squares = [
+            {(x, y) for x in range(dim) for y in range(dim) if owned[index] >> (x * width + y) & 1}
+            for index in range(config.num_players)
+        ]
+        occupied = table.covering(square_list(dim, set().union(*squares)))
+        for index, own in enumerate(squares):
+            next_to = {(x + dx, y + dy) for x, y in own for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1))}
+            corners = {(x + dx, y + dy) for x, y in own for dx, dy in diagonal_offsets}
+            if flags >> index & 1:
+                corners.add(config.starts[index])
+            fits = table.all_moves & ~occupied & ~table.covering(square_list(dim, next_to))
+            for piece in range(len(config.pieces)):
+                if not remaining[index] >> piece & 1:
+                    fits &= ~table.piece_masks[piece]
+                    games.remaining[:, index, piece] = False
+            games.fits[:, index] = fits
+            games.touches[:, index] = table.covering(square_list(dim, corners))
+            games.cannot_move[:, index] = flags >> (index + 4) & 1 == 1
+        games.current_player = current_player
+        games.start = position
+        return games
+    
+    # gets which games are still being played
+    def active(self):
+        return ~self.cannot_move.all(axis=1)
+    
+    # gets the masks of the valid moves of the side to move
+    def valid_masks(self):
+        index = self.current_player - 1
+        legal = self.fits[:, index] & self.touches[:, index]
+        legal[self.cannot_move[:, index]] = 0
+        return legal
+    
+    # gets a games by placements array of the valid moves of the side to move
+    def valid_moves(self):
+        legal = self.valid_masks()
+        return np.unpackbits(legal.view(np.uint8), axis=1, bitorder="little").astype(bool)
+    
+    # picks a random move of each game from its valid moves, of the most
+    # valuable piece with "large", returns the placement, -1 for no move
+    def pick_moves(self, legal, policy):
+        counts = np.bitwise_count(legal).astype(np.int64)
+        if policy == "large":
+            tiers = np.add.reduceat(counts, [word for value, word in self.table.tiers], axis=1)
+            best = np.array([value for value, word in self.table.tiers])[(tiers > 0).argmax(axis=1)]
+            counts[self.table.word_values != best[:, None]] = 0
+        elif policy != "random":
+            raise ValueError(f"Invalid batch policy: {policy}")
+        
+        # the chosen valid move is the bit reached after skipping a random number of them
+        ends = np.cumsum(counts, axis=1)
+        totals = ends[:, -1]
+        skip = (self.rng.random(len(legal)) * totals).astype(np.int64)
+        words = (ends <= skip[:, None]).sum(axis=1)
+        words = np.minimum(words, self.table.words - 1)
+        rows = np.arange(len(legal))
+        skip -= ends[rows, words] - counts[rows, words]
+        bits = np.unpackbits(legal[rows, words].view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        positions = (np.cumsum(bits, axis=1) <= skip[:, None]).sum(axis=1)
+        return np.where(totals > 0, words * 64 + positions, -1)
+    
+    # plays one move, or a pass, in every game still being played, returns the number of them
+    def step(self, policy):
+        table = self.table
+        index = self.current_player - 1
+        active = self.active()
+        choice = self.pick_moves(self.valid_masks(), policy)
+        
+        # games whose player has no valid move pass
+        self.cannot_move[active & (choice < 0), index] = True
+        games = np.flatnonzero(choice >= 0)
+        placements = choice[games]
+        
+        covered = np.bitwise_or.reduce(table.square_masks[table.covered[placements]], axis=1)
+        self.fits[games] &= ~covered[:, None]
+        edges = np.bitwise_or.reduce(table.square_masks[table.edges[placements]], axis=1)
+        self.fits[games, index] &= ~(edges | table.piece_masks[table.pieces[placements]])
+        self.touches[games, index] |= np.bitwise_or.reduce(table.square_masks[table.diagonals[placements]], axis=1)
+        self.remaining[games, index, table.pieces[placements]] = False
+        
+        moves = np.full(self.n, -1, dtype=np.int32)
+        moves[games] = table.moves[placements]
+        self.moves.append(moves)
+        self.current_player = next_player(self.current_player, self.config.num_players)
+        return int(active.sum())
+    
+    # plays every game to the end, each player with its policy,
+    # and returns the winner of each game
+    def play(self, policies):
+        while self.active().any():
+            self.step(policies[self.current_player - 1])
+        return self.winners()
+    
+    # gets a games by players array of the value of the pieces each player has left
+    def remaining_values(self):
+        return self.remaining.astype(np.int64) @ self.table.piece_values
+    
+    # gets the winner of each game, 0 for a tie, like winner_of
+    def winners(self):
+        remaining = self.remaining_values()
+        least = remaining.min(axis=1, keepdims=True)
+        leaders = remaining == least
+        return np.where(leaders.sum(axis=1) == 1, leaders.argmax(axis=1) + 1, 0)
 
-        # Return true as long as there was at least one corner
-        return touching_corner
+
+# Writes the positions of finished games to a directory for fitting
+# evaluations. Every position a game reached before it was over is a fixed
+# width record: the bytes of its Position, then the winner (0 for a tie)
+# and the value of the pieces each player had left at the end. Records are
+# appended to chunk files of at most chunk_size records, each starting with
+# a header, and the configuration is saved next to them, so the files can be
+# memory mapped by PositionReader while more games are added. A writer
+# opened on a directory of the same configuration adds new chunks after the
+# ones already there.
+class PositionWriter:
     
-    # places a piece on the board
-    def place_piece(self, piece, x, y, ori, current_player):
+    magic = b"BLKP"
+    version = 1
+    header = struct.Struct("<4sII")
+    
+    def __init__(self, directory, config, chunk_size=1 << 20):
+        self.directory = directory
+        self.config = config
+        self.chunk_size = chunk_size
+        self.record_size = config.position_bytes + 1 + config.num_players
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            "version": self.version,
+            "name": config.name,
+            "board": config.board_dim,
+            "pieces": config.piece_names,
+            "starts": [list(start) for start in config.starts],
+            "record_size": self.record_size
+        }
+        meta_path = os.path.join(directory, "positions.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f) != meta:
+                    raise ValueError(f"{directory} holds positions of another configuration")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
         
-        if ori == "right":
-            piece = [[piece[j][i] for j in range(len(piece) - 1, -1, -1)] for i in range(len(piece[0]))]
-        elif ori == "left":
-            piece = [[piece[j][i] for j in range(len(piece))] for i in range(len(piece[0]) - 1, -1, -1)]
-        elif ori == "down":
-            piece = [row[::-1] for row in piece[::-1]]
-            
-        for i in range(len(piece)):
-            for j in range(len(piece[0])):
-                if piece[i][j] == 1:
-                    self.squares[x + i][y + j] = current_player
+        # the chunk being written and the records in it
+        self.chunk = len(chunk_paths(directory))
+        self.file = None
+        self.count = 0
+        self.positions = 0
     
-    # undo a move            
-    def undo_move(self, piece, x, y, ori):
-            
-            if ori == "right":
-                piece = [[piece[j][i] for j in range(len(piece) - 1, -1, -1)] for i in range(len(piece[0]))]
-            elif ori == "left":
-                piece = [[piece[j][i] for j in range(len(piece))] for i in range(len(piece[0]) - 1, -1, -1)]
-            elif ori == "down":
-                piece = [row[::-1] for row in piece[::-1]]
-                
-            for i in range(len(piece)):
-                for j in range(len(piece[0])):
-                    if piece[i][j] == 1:
-                        self.squares[x + i][y + j] = 0
-                
+    # appends records, starting a new chunk whenever one is full
+    def write(self, records):
+        while records:
+            if self.file is None or self.count == self.chunk_size:
+                self.close()
+                self.file = open(os.path.join(self.directory, f"positions-{self.chunk:05d}.bin"), "wb")
+                self.file.write(self.header.pack(self.magic, self.version, self.record_size))
+                self.chunk += 1
+                self.count = 0
+            fitting = records[:self.chunk_size - self.count]
+            records = records[len(fitting):]
+            self.file.write(b"".join(fitting))
+            self.count += len(fitting)
+            self.positions += len(fitting)
     
-    # Gets the corner diff of a move
-    def corner_diff_for_move(self, piece, x, y, ori, current_player):
+    # adds the positions of a game given as its (player, move) list, from the
+    # start position or the empty board. Passes are not listed: a player
+    # passes until the listed player is to move, and after the last move
+    # until the game is over.
+    def add_game(self, moves, start=None):
+        position = start or Position.initial(self.config)
+        positions = []
+        for player, move in moves:
+            while position.current_player != player:
+                positions.append(position)
+                position = position.apply(None)
+            positions.append(position)
+            position = position.apply(move)
+        while not position.is_over():
+            positions.append(position)
+            position = position.apply(None)
         
-        starting_corner_diff = self.get_corner_diff()
-        self.place_piece(piece, x, y, ori, current_player)
-        ending_corner_diff = self.get_corner_diff()
-        self.undo_move(piece, x, y, ori)
-        value = ending_corner_diff - starting_corner_diff
-        if current_player == 2:
-            value *= -1
-        return value
-                    
-                    
-    # prints the board
-    def print_board(self):
-        for _ in range(self.dim * 2 + 2):
-            print("─", end="")
-        print()
-        for i, row in enumerate(self.squares):
-            print("|", end="")
-            for cell in row:
-                if cell == 0:
-                    print(" ", end=" ")
-                elif cell == 1:
-                    print("X", end=" ")
-                elif cell == 2:
-                    print("O", end=" ")
-                else:
-                    print("#", end=" ")
-            if i < len(self.squares) - 1:
-                print("|")  # End the line
-            else:
-                print("|", end="") 
-        print()
-        for _ in range(self.dim * 2 + 2):
-            print("─", end="")
-        print()
-                
+        # the outcome, from the pieces left at the end
+        values = self.config.get_move_table().values
+        remaining = [
+            sum(value for piece, value in enumerate(values) if mask >> piece & 1)
+            for mask in position.unpack()[2]
+        ]
+        outcome = bytes([winner_of(dict(enumerate(remaining, 1)))] + remaining)
+        self.write([position.data + outcome for position in positions])
+    
+    # adds the positions of every game of a finished batch of BatchGames
+    def add_batch(self, games):
+        if games.config is not self.config:
+            raise ValueError("The games are of another configuration")
+        first_player = games.start.current_player if games.start is not None else 1
+        moves = np.array(games.moves, dtype=np.int32).reshape(len(games.moves), games.n).T
+        for row in moves.tolist():
+            player = first_player
+            game = []
+            for move in row:
+                if move >= 0:
+                    game.append((player, move))
+                player = next_player(player, self.config.num_players)
+            self.add_game(game, games.start)
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+# gets the chunk files of a directory of positions in order
+def chunk_paths(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("positions-") and name.endswith(".bin")
+    )
+
+
+# Reads the positions written by PositionWriter as numpy batches. Each chunk
+# file is memory mapped, so only the records of a batch are read, and a
+# batch is a dict of arrays with one row per position:
+#   player         side to move
+#   first_move     players by whether they have yet to make their first move
+#   cannot_move    players by whether they have passed
+#   remaining      players by pieces, whether each piece is left
+#   planes         players by board squares, whether the player covers the square
+#   winner         winner of the game, 0 for a tie
+#   final_values   value of the pieces each player had left at the end
+# A trailing record cut short, such as by a writer that was stopped, is skipped.
+class PositionReader:
+    def __init__(self, directory):
+        if np is None:
+            raise ImportError("PositionReader needs numpy")
+        with open(os.path.join(directory, "positions.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != PositionWriter.version:
+            raise ValueError(f"{directory} holds positions of another version")
+        self.config = config_from_names(
+            self.meta["board"], self.meta["pieces"], [tuple(start) for start in self.meta["starts"]], self.meta["name"]
+        )
+        self.record_size = self.meta["record_size"]
+        header = PositionWriter.header
+        self.chunks = []
+        for path in chunk_paths(directory):
+            with open(path, "rb") as f:
+                magic, version, record_size = header.unpack(f.read(header.size))
+            if magic != PositionWriter.magic or record_size != self.record_size:
+                raise ValueError(f"{path} is not a chunk of these positions")
+            count = (os.path.getsize(path) - header.size) // record_size
+            if count:
+                self.chunks.append(np.memmap(path, dtype=np.uint8, mode="r", offset=header.size, shape=(count, record_size)))
+    
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+    
+    # yields the positions in batches of up to batch_size, a batch does not span chunks
+    def batches(self, batch_size=4096):
+        for chunk in self.chunks:
+            for start in range(0, len(chunk), batch_size):
+                yield self.decode(chunk[start:start + batch_size])
+    
+    # gets the position of a record by its index over all chunks
+    def position(self, index):
+        for chunk in self.chunks:
+            if index < len(chunk):
+                return Position.from_bytes(self.config, chunk[index, :self.config.position_bytes].tobytes())
+            index -= len(chunk)
+        raise IndexError("position index out of range")
+    
+    # splits an array of records into the fields of a batch
+    def decode(self, records):
+        config = self.config
+        players, dim = config.num_players, config.board_dim
+        flags = records[:, 1:2]
+        batch = {
+            "player": records[:, 0],
+            "first_move": np.unpackbits(flags, axis=1, bitorder="little")[:, :players].astype(bool),
+            "cannot_move": np.unpackbits(flags >> 4, axis=1, bitorder="little")[:, :players].astype(bool)
+        }
+        
+        offset = 2
+        remaining = []
+        for _ in range(players):
+            bits = np.unpackbits(records[:, offset:offset + config.piece_bytes], axis=1, bitorder="little")
+            remaining.append(bits[:, :len(config.pieces)])
+            offset += config.piece_bytes
+        batch["remaining"] = np.stack(remaining, axis=1).astype(bool)
+        
+        # owned squares are BitBoard masks, with a guard column after each row
+        planes = []
+        for _ in range(players):
+            bits = np.unpackbits(records[:, offset:offset + config.board_bytes], axis=1, bitorder="little")
+            planes.append(bits[:, :dim * (dim + 1)].reshape(-1, dim, dim + 1)[:, :, :dim])
+            offset += config.board_bytes
+        batch["planes"] = np.stack(planes, axis=1).astype(bool)
+        
+        batch["winner"] = records[:, offset]
+        batch["final_values"] = records[:, offset + 1:offset + 1 + players]
+        return batch
+
+
+# Counters and cumulative timers for the board methods the strategies spend
+# their time in, split by the strategy that was moving. Nothing is measured
+# until a board is attached: the board's methods are then replaced on that
+# board only with timed versions, so games without a profiler run the plain
+# methods. It can also run one selected game under cProfile.
+class Profiler:
+    
+    # board methods that are timed
+    methods = (
+        "get_valid_moves", "is_move_valid", "score_moves", "corner_diff_for_move",
+        "get_corner_diff", "get_block_diff", "place_piece", "undo_move"
+    )
+    
+    def __init__(self, profile_game=None, profile_file="blokus.prof"):
+        
+        # (strategy, name) -> number of calls and seconds
+        self.counts = {}
+        self.times = {}
+        
+        # strategy of the player moving, set by make_move
+        self.strategy = None
+        
+        # number of the game to run under cProfile, counted from 0, and the file its stats go to
+        self.profile_game = profile_game
+        self.profile_file = profile_file
+        self.games = 0
+        
+        # the counters when the current game started
+        self.game_counts = {}
+        self.game_times = {}
+    
+    # adds to a counter, and to its timer if a time is given
+    def add(self, name, count=1, seconds=0.0):
+        key = (self.strategy, name)
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.times[key] = self.times.get(key, 0.0) + seconds
+    
+    # replaces the timed methods of a board with versions that count and time their calls
+    def attach(self, board):
+        for name in self.methods:
+            setattr(board, name, self.timed(getattr(board, name), name))
+        return board
+    
+    def timed(self, method, name):
+        counts, times = self.counts, self.times
+        def call(*args):
+            start = time.perf_counter()
+            result = method(*args)
+            key = (self.strategy, name)
+            times[key] = times.get(key, 0.0) + time.perf_counter() - start
+            counts[key] = counts.get(key, 0) + 1
+            return result
+        return call
+    
+    # counts a game starting, returns whether it is the one to run under cProfile
+    def start_game(self):
+        selected = self.games == self.profile_game
+        self.games += 1
+        self.game_counts = dict(self.counts)
+        self.game_times = dict(self.times)
+        return selected
+    
+    # gets the counters as [strategy, name, calls, seconds] rows, which can be sent between processes
+    def summary(self):
+        return [[strategy, name, count, self.times.get((strategy, name), 0.0)] for (strategy, name), count in self.counts.items()]
+    
+    # gets the rows of the current game alone, what the counters gained since it started
+    def game_summary(self):
+        rows = []
+        for key, count in self.counts.items():
+            count -= self.game_counts.get(key, 0)
+            if count:
+                rows.append([key[0], key[1], count, self.times.get(key, 0.0) - self.game_times.get(key, 0.0)])
+        return rows
+    
+    # adds the rows of another profiler's summary
+    def merge(self, summary):
+        for strategy, name, count, seconds in summary:
+            key = (strategy, name)
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.times[key] = self.times.get(key, 0.0) + seconds
+    
+    # gets the counters as a table, one block per strategy with the slowest first.
+    # Timers include the timed methods they call.
+    def report(self):
+        lines = [f"{'strategy':<28} {'name':<22} {'calls':>10} {'total s':>10} {'us/call':>10}"]
+        for strategy in sorted({strategy for strategy, name in self.counts}, key=str):
+            rows = [(name, count, self.times.get((key_strategy, name), 0.0))
+                    for (key_strategy, name), count in self.counts.items() if key_strategy == strategy]
+            rows.sort(key=lambda row: row[2], reverse=True)
+            for name, count, seconds in rows:
+                per_call = f"{seconds / count * 1e6:10.1f}" if seconds and count else f"{'':>10}"
+                lines.append(f"{str(strategy):<28} {name:<22} {count:>10} {seconds:>10.3f} {per_call}")
+        return "\n".join(lines)
 
 
 class Blokus:
-    def __init__(self, board_dim, pieces, p1_strategy, p2_strategy):
-        self.board = Board(board_dim)
+    def __init__(self, board_dim, pieces, p1_strategy, p2_strategy, board_class=Board, verbose=True, seed=None, book=None,
+                 config=None, more_strategies=(), profiler=None):
+        if seed is not None:
+            random.seed(seed)
+        reset_searches()
+        
+        # the board size and pieces are taken from the configuration when one is given
+        if config is None:
+            config = get_config(board_dim, pieces)
+        strategies = [p1_strategy, p2_strategy, *more_strategies]
+        if len(strategies) != config.num_players:
+            raise ValueError(f"A {config.name} game needs {config.num_players} strategies")
+        config.load_tables()
+        board_dim, pieces = config.board_dim, config.pieces
+        self.config = config
+        
+        self.board = board_class(board_dim, config.starts)
+        
+        # counts and times the board methods when given
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.attach(self.board)
+        
         self.pieces = pieces
-        self.players = {
-            1: list(pieces.keys()),
-            2: list(pieces.keys())
-        }
+        self.orientations = get_orientations(pieces)
+        self.move_table = get_move_table(board_dim, pieces)
+        self.players = {player: list(pieces.keys()) for player in range(1, config.num_players + 1)}
         self.current_player = 1
-        self.first_move = {1: True, 2: True}
-        self.strategies = {1: p1_strategy, 2: p2_strategy}
-        self.cannot_move = {1: False, 2: False}
-        print(f"Player 1 strategy: {p1_strategy} Player 2 strategy: {p2_strategy}")
+        self.first_move = {player: True for player in self.players}
+        self.strategies = dict(zip(self.players, strategies))
+        self.cannot_move = {player: False for player in self.players}
+        
+        # Monte Carlo search trees of the players using MCTS, kept between moves
+        self.mcts_trees = {}
+        
+        # opening book consulted by the search strategies until a position is not in it
+        self.book = book
+        self.in_book = book is not None
+        
+        # exact solver the search strategies switch to near the end of the game
+        self.endgame = EndgameSolver()
+        
+        # prints the game as it is played when set, otherwise nothing is printed
+        self.verbose = verbose
+        
+        # compact record of the game, filled in as it is played
+        self.record = {
+            "seed": seed,
+            "config": config.name,
+            "board": board_dim,
+            "strategies": strategies,
+            "moves": [],
+            "think_times": [],
+            "remaining": None,
+            "winner": None,
+            
+            # numbers of the moves the endgame solver chose
+            "solved": []
+        }
+        if self.verbose:
+            print(" ".join(f"Player {player} strategy: {strategy}" for player, strategy in self.strategies.items()))
+    
+    # starts a game of a configuration, with one strategy per player, such as
+    # Blokus.from_config(game_configs["standard"], ["large", "combo", "corner", "mcts@1s"])
+    @classmethod
+    def from_config(cls, config, strategies, board_class=Board, verbose=True, seed=None, book=None, profiler=None):
+        return cls(config.board_dim, config.pieces, strategies[0], strategies[1], board_class, verbose, seed, book,
+                   config=config, more_strategies=strategies[2:], profiler=profiler)
     
+    # gets the player who moves next
+    def next_player(self):
+        return next_player(self.current_player, len(self.players))
         
     # get all valid moves
     def get_valid_moves(self):
-        
-        valid_moves = []
-        # iterate over the pieces of the current player
-        for piece_name in self.players[self.current_player]:
-            piece = self.pieces[piece_name]["shape"]
-            
-            # iterate over the board with extra padding
-            for x in range(-5, self.board.dim + 5):
-                for y in range(-5, self.board.dim + 5):
-                    
-                    #add the move if it is valid in all orientations
-                    if self.board.is_move_valid(piece, x, y, "up", self.current_player, self.first_move[self.current_player]):
-                        valid_moves.append((piece_name, piece, x, y, "up"))
-                    if self.board.is_move_valid(piece, x, y, "right", self.current_player, self.first_move[self.current_player]):
-                        valid_moves.append((piece_name, piece, x, y, "right"))
-                    if self.board.is_move_valid(piece, x, y, "left", self.current_player, self.first_move[self.current_player]):
-                        valid_moves.append((piece_name, piece, x, y, "left"))
-                    if self.board.is_move_valid(piece, x, y, "down", self.current_player, self.first_move[self.current_player]):
-                        valid_moves.append((piece_name, piece, x, y, "down"))
-                    
-        return valid_moves
+        return self.board.get_valid_moves(
+            self.players[self.current_player],
+            self.move_table,
+            self.current_player,
+            self.first_move[self.current_player]
+        )
     
     # # picks a random move from the valid moves
     def select_random_move(self):
         
         valid_moves = self.get_valid_moves()
         if not valid_moves:
-            return None, None, None, None, None
+            return None
         random_index = random.randint(0, len(valid_moves) - 1)
         return valid_moves[random_index]
     
-    # picks a random move from the valid moves with the largest piece size
-    def select_large_move(self):
+    # picks the valid move an evaluator scores highest, breaking ties at random
+    def select_greedy_move(self, evaluator):
         valid_moves = self.get_valid_moves()
         if not valid_moves:
-            return None, None, None, None, None
-
-        # Pair sizes with their indices, adding a small random value for randomness
-        sizes = [(pieces[move[0]]["value"] + random.random(), i) for i, move in enumerate(valid_moves)]
-    
-        # Sort by size (now includes random tiebreaker)
-        sizes.sort(key=lambda x: x[0], reverse=True)
-    
-        # Select the index of the smallest size
-        index = sizes[0][1]
+            return None
+        keys = evaluator.move_keys(self.get_state(), valid_moves)
+        index = max(range(len(valid_moves)), key=lambda i: keys[i] + random.random())
         return valid_moves[index]
-    
-    def get_corner_move(self):
-        valid_moves = self.get_valid_moves()
-        if not valid_moves:
-            return None, None, None, None, None
-        corner_moves = []
-        for piece_name, piece, x, y, ori in valid_moves:
-            corner_diff = self.board.corner_diff_for_move(piece, x, y, ori, self.current_player)
-            #print(corner_diff + random.random(), (piece_name, piece, x, y, ori))
-            corner_moves.append((corner_diff + random.random(), (piece_name, piece, x, y, ori)))
-            
-        corner_moves.sort(key=lambda x: x[0], reverse=True)
-        return corner_moves[0][1]
-    
-    def get_combo_move(self):
-        valid_moves = self.get_valid_moves()
-        if not valid_moves:
-            return None, None, None, None, None
-        corner_moves = []
-        for piece_name, piece, x, y, ori in valid_moves:
-            corner_diff = self.board.corner_diff_for_move(piece, x, y, ori, self.current_player)
-            #print(corner_diff + random.random(), (piece_name, piece, x, y, ori))
-            corner_moves.append((pieces[piece_name]["value"] + corner_diff + random.random(), (piece_name, piece, x, y, ori)))
-            
-        corner_moves.sort(key=lambda x: x[0], reverse=True)
-        return corner_moves[0][1]
                     
     # makes a move for the current player
     def make_move(self):
         
-        # select a move
-        piece_name, piece, x, y, ori = None, None, None, None, None
-        
-        if self.strategies[self.current_player] == "random":
-            piece_name, piece, x, y, ori = self.select_random_move()
-        elif self.strategies[self.current_player] == "large":
-            piece_name, piece, x, y, ori = self.select_large_move()
-        elif self.strategies[self.current_player] == "corner":
-            piece_name, piece, x, y, ori = self.get_corner_move()
-        elif self.strategies[self.current_player] == "combo":
-            piece_name, piece, x, y, ori = self.get_combo_move()
-        elif self.strategies[self.current_player] == "minimax-large":
-            piece_name, piece, x, y, ori = self.get_minimax_move("large", depth=3)
-        elif self.strategies[self.current_player] == "minimax-corner":
-            piece_name, piece, x, y, ori = self.get_minimax_move("corner", depth=3)
-        elif self.strategies[self.current_player] == "minimax-combo":
-            piece_name, piece, x, y, ori = self.get_minimax_move("combo", depth=3)
+        # select a move, None if the player has no valid moves
+        move = None
+        
+        # a strategy can carry a budget and settings, such as "minimax-combo@200ms"
+        # or "mcts@2000n,workers=4"
+        strategy, _, options = self.strategies[self.current_player].partition("@")
+        budget, settings = parse_options(options)
+        depth = settings.get("depth", 3)
+        workers = settings.get("workers", 1)
+        if self.profiler is not None:
+            self.profiler.strategy = self.strategies[self.current_player]
+        start_time = time.perf_counter()
+        
+        # the search strategies take book moves in the opening and solve the
+        # endgame exactly, unless the "endgame" setting (pieces left) is 0.
+        # Both only know two player games.
+        known_move = None
+        if strategy.startswith(("minimax", "mcts")) and len(self.players) == 2:
+            if self.in_book:
+                known_move = self.book.lookup(self.get_state())
+                self.in_book = known_move is not None
+            max_pieces = settings.get("endgame", self.endgame.max_pieces)
+            if known_move is None and max_pieces > 0:
+                known_move = self.get_endgame_move(max_pieces)
+        
+        if known_move is not None:
+            move = known_move
+        elif strategy == "random":
+            move = self.select_random_move()
+        elif strategy in evaluators:
+            move = self.select_greedy_move(evaluators[strategy])
+        elif strategy.startswith("minimax-") and strategy[8:] in minimax_searches:
+            move = self.get_minimax_move(strategy[8:], depth, budget, workers, settings)
+        elif strategy == "mcts":
+            move = self.get_mcts_move("large", budget, workers, settings.get("batch", 1))
+        elif strategy == "mcts-random":
+            move = self.get_mcts_move("random", budget, workers, settings.get("batch", 1))
         
         else:
             raise ValueError("Invalid strategy")
         
+        think_time = time.perf_counter() - start_time
+        if self.profiler is not None:
+            self.profiler.add("make_move", 1, think_time)
+
+        # keep the search trees in step with the game
+        for tree in self.mcts_trees.values():
+            tree.advance(move)
+        
         # if no valid moves
-        if piece_name is None:
+        if move is None:
             
             self.cannot_move[self.current_player] = True
-            print(f"Player {self.current_player} has no valid moves")
+            if self.verbose:
+                print(f"Player {self.current_player} has no valid moves")
             self.first_move[self.current_player] = False
-            self.current_player = 3 - self.current_player
+            self.current_player = self.next_player()
             
-            if self.cannot_move[1] == True and self.cannot_move[2] == True:
+            if all(self.cannot_move.values()):
                 return -1
             
             return 0
             
         
         # place the piece on the board
-        self.board.place_piece(piece, x, y, ori, self.current_player)
-        print(f"Player {self.current_player} placed {piece_name} {ori} at ({x}, {y}).")
-        self.board.print_board()
+        piece_name, piece, x, y, ori = self.move_table.decode(move)
+        self.board.place_piece(piece, x, y, self.current_player)
+        self.record["moves"].append((self.current_player, move))
+        self.record["think_times"].append(round(think_time, 6))
+        if self.verbose:
+            print(f"Player {self.current_player} placed {self.move_table.describe(move)}.")
+            self.board.print_board()
         
         # remove the piece from the player's list of pieces
         self.players[self.current_player].remove(piece_name)
@@ -406,16 +3169,28 @@ class Blokus:
         self.first_move[self.current_player] = False
         
         # update the current player
-        self.current_player = 3 - self.current_player
+        self.current_player = self.next_player()
     
         return 0
     
-    # play the game
-    def play_game(self):
+    # Play the game, appending its record to log_file as a line of JSON if
+    # given. With a profile file, or when the profiler selects this game,
+    # the game runs under cProfile and its stats are written to the file.
+    # With an export, a PositionWriter, the positions of the game are added to it.
+    def play_game(self, log_file=None, profile_file=None, export=None):
+        if export is not None and export.config is not self.config:
+            raise ValueError("The export is of another configuration")
+        if self.profiler is not None and self.profiler.start_game():
+            profile_file = profile_file or self.profiler.profile_file
+        profile = None
+        if profile_file is not None:
+            profile = cProfile.Profile()
+            profile.enable()
         
         # print the initial board
-        print(f"Starting Blokus! {self.board.dim}x{self.board.dim} board")
-        self.board.print_board()
+        if self.verbose:
+            print(f"Starting Blokus! {self.board.dim}x{self.board.dim} board")
+            self.board.print_board()
         
         # initialize the value to 0
         value = 0
@@ -425,256 +3200,139 @@ class Blokus:
             
             # set the value to the result of the move
             value = self.make_move()
-            
-        p1_pieces = sum((self.pieces[piece]["value"]) for piece in self.players[1])
-        p2_pieces = sum((self.pieces[piece]["value"]) for piece in self.players[2])
-        
-        # if the current player has no moves, the other player wins
-        if p1_pieces > p2_pieces:
-            value = 2
-        elif p2_pieces > p1_pieces:
-            value = 1
-        else:
-            print(f"Game over! Its a tie!")
-            print(f"Both players have no pieces left!")
-            return 0
-            
-        print(f"Game over! Player {value} wins!")
-        print(f"Player 1 has {p1_pieces} blocks left, Player 2 has {p2_pieces} blocks left")
+        
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(profile_file)
+        
+        # the player with the least left wins
+        remaining = remaining_values(self.pieces, self.players)
+        value = winner_of(remaining)
+        
+        self.record["remaining"] = list(remaining.values())
+        self.record["winner"] = value
+        self.record["endgame"] = self.endgame.stats()
+        if self.profiler is not None:
+            self.record["profile"] = self.profiler.game_summary()
+        if log_file is not None:
+            with open(log_file, "a") as f:
+                f.write(json.dumps(self.record) + "\n")
+        if export is not None:
+            export.add_game(self.record["moves"])
+        
+        if self.verbose:
+            if value == 0:
+                print(f"Game over! Its a tie!")
+                print(f"Both players have no pieces left!")
+            else:
+                print(f"Game over! Player {value} wins!")
+                print(", ".join(f"Player {player} has {left} blocks left" for player, left in remaining.items()))
+            if self.profiler is not None:
+                print(self.profiler.report())
         return value
 
     
     
-    def minimax_large(self, board, depth, alpha, beta, maximizing_player):
-      
-        # Check if we've reached the depth limit or if there are no valid moves
-        valid_moves = self.get_valid_moves()
-        
-        player_making_move = 1 if maximizing_player else 2
-        
-        if depth == 0 or not valid_moves:
-            # Evaluate the board using the heuristic
-            return board.get_block_diff(), (None, None, None, None, None)
-        
-        sizes = [(pieces[move[0]]["value"], move) for move in valid_moves]
-        sizes.sort(key=lambda x: x[0], reverse=True)
-        max_size = sizes[0][0]
-        valid_moves = [move for size, move in sizes if size == max_size or size == max_size - 1 or size == max_size - 2]
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_large(board, depth - 1, alpha, beta, False)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
+    # gets a packed copy of the position
+    def get_position(self):
+        return Position.from_state(self.get_state())
+    
+    # gets a copy of the game state that search can change and undo,
+    # on another board holding the same position if one is given
+    def get_state(self, board=None):
+        return GameState(
+            board or self.board,
+            self.pieces,
+            self.move_table,
+            self.current_player,
+            self.players,
+            self.first_move,
+            self.cannot_move
+        )
 
-            return max_eval, best_move
+    # solves the position exactly if it is small enough, returns None otherwise
+    def get_endgame_move(self, max_pieces):
+        state = self.get_state()
+        valid_moves = state.get_valid_moves()
+        if not valid_moves or not self.endgame.should_solve(state, valid_moves, max_pieces):
+            return None
+        start_nodes = self.endgame.nodes
+        result = self.endgame.solve(state)
+        if self.profiler is not None:
+            self.profiler.add("endgame nodes", self.endgame.nodes - start_nodes)
+        if result is None:
+            return None
+        score, best_move = result
+        self.record["solved"].append(len(self.record["moves"]))
+        if self.verbose:
+            print(f"Endgame solved: score {score} for player 1")
+        return best_move
 
+    # searches with MCTS for the given number of playouts or time budget,
+    # rollouts always run on a BitBoard copy of the position. With more than
+    # one worker, each worker process grows its own tree with that budget.
+    # A batch of more than one plays that many rollouts per leaf at once.
+    def get_mcts_move(self, rollout, budget="", workers=1, batch=1):
+        if budget:
+            time_limit, iterations = parse_budget(budget)
         else:
-            min_eval = float('inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_large(board, depth - 1, alpha, beta, True)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-
-            return min_eval, best_move
-        
-    def minimax_corner(self, board, depth, alpha, beta, maximizing_player):
-      
-        # Check if we've reached the depth limit or if there are no valid moves
-        valid_moves = self.get_valid_moves()
-        
-        player_making_move = 1 if maximizing_player else 2
-        
-        if depth == 0 or not valid_moves:
-            # Evaluate the board using the heuristic
-            return board.get_corner_diff(), (None, None, None, None, None)
-        
-        corner_moves = []
-        for move in valid_moves:
-            piece_name, piece, x, y, ori = move
-            corner_diff = self.board.corner_diff_for_move(piece, x, y, ori, self.current_player)
-            corner_moves.append((corner_diff, move))
-            
-        corner_moves.sort(key=lambda x: x[0], reverse=True)
-        max_corners = corner_moves[0][0]
-        valid_moves = [move for corner_diff, move in corner_moves if corner_diff == max_corners or corner_diff == max_corners - 1 or corner_diff == max_corners - 2]
-        
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_corner(board, depth - 1, alpha, beta, False)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-
-            return max_eval, best_move
-
+            time_limit, iterations = None, mcts_iterations
+        start_time = time.perf_counter()
+        if workers > 1:
+            best_move, playouts = parallel_mcts(self.get_state(), rollout, iterations, time_limit, workers, batch)
         else:
-            min_eval = float('inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_corner(board, depth - 1, alpha, beta, True)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
+            tree = self.mcts_trees.setdefault(self.current_player, MCTS(rollout))
+            tree.batch = batch
+            board = BitBoard.from_board(self.board)
+            if self.profiler is not None:
+                self.profiler.attach(board)
+            best_move = tree.search(self.get_state(board), iterations, time_limit)
+            playouts = tree.last_playouts
+        if self.profiler is not None:
+            self.profiler.add("playouts", playouts)
+        if self.verbose:
+            rate = playouts / max(time.perf_counter() - start_time, 1e-9)
+            print(f"MCTS: {playouts} playouts, {rate:.0f} playouts/sec")
+        return best_move
 
-            return min_eval, best_move
-        
-    
-    def minimax_combo(self, board, depth, alpha, beta, maximizing_player):
-      
-        # Check if we've reached the depth limit or if there are no valid moves
-        valid_moves = self.get_valid_moves()
-        
-        player_making_move = 1 if maximizing_player else 2
-        
-        if depth == 0 or not valid_moves:
-            # Evaluate the board using the heuristic
-            return board.get_block_diff() + board.get_corner_diff(), (None, None, None, None, None)
+    # searches to a fixed depth, or deepens until the budget runs out when one is given.
+    # A fixed depth search can split its root moves over several worker processes.
+    # The settings can change the pruning policy, see get_minimax_engine.
+    def get_minimax_move(self, strategy, depth=3, budget="", workers=1, settings=None):
+        if len(self.players) != 2:
+            raise ValueError("Minimax only plays two player games")
+        engine = get_minimax_engine(strategy, settings or {})
         
-        corner_moves = []
-        for move in valid_moves:
-            piece_name, piece, x, y, ori = move
-            corner_diff = board.corner_diff_for_move(piece, x, y, ori, player_making_move)
-            size = pieces[piece_name]["value"]
-            corner_moves.append((corner_diff + size, move))
-            
-        corner_moves.sort(key=lambda x: x[0], reverse=True)
-        max_corners = corner_moves[0][0]
-        valid_moves = [move for corner_diff, move in corner_moves if 
-                       corner_diff == max_corners or 
-                       corner_diff == max_corners - 1 or 
-                       corner_diff == max_corners - 2 or 
-                       corner_diff == max_corners - 3 or 
-                       corner_diff == max_corners - 4]
-        
-
-        if maximizing_player:
-            max_eval = float('-inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_combo(board, depth - 1, alpha, beta, False)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-
-            return max_eval, best_move
-
+        # nodes searched in worker processes are not counted
+        start_nodes, start_pruned = engine.nodes, engine.pruned
+        if workers > 1:
+            if budget:
+                raise ValueError("Parallel minimax searches to a fixed depth and takes no budget")
+            _, best_move = parallel_minimax(self.get_state(), strategy, depth, workers, settings)
+        elif budget:
+            time_limit, node_limit = parse_budget(budget)
+            _, best_move, _ = engine.iterative_search(
+                self.get_state(), time_limit=time_limit, node_limit=node_limit
+            )
         else:
-            min_eval = float('inf')
-            best_move = None
-
-            for move in valid_moves:
-                piece_name, piece, x, y, ori = move
-                # Apply the move
-                board.place_piece(piece, x, y, ori, player_making_move)
-                # Recurse
-                eval, _ = self.minimax_combo(board, depth - 1, alpha, beta, True)
-                # Undo the move
-                board.undo_move(piece, x, y, ori)
-                # Update the best evaluation
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                # Alpha-beta pruning
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-
-            return min_eval, best_move
-
+            engine.new_search()
+            _, best_move = engine.search(self.get_state(), depth)
+        if self.profiler is not None:
+            self.profiler.add("search nodes", engine.nodes - start_nodes)
+        if self.verbose:
+            print(f"Minimax: {engine.nodes - start_nodes} nodes, {engine.pruned - start_pruned} moves pruned by the window")
+        return best_move
 
-    def get_minimax_move(self, strategy, depth=3):
-        if strategy == "large":
-            maximizing_player = (self.current_player == 1)
-            _, best_move = self.minimax_large(self.board, depth, float('-inf'), float('inf'), maximizing_player)
-            return best_move
-        elif strategy == "corner":
-            maximizing_player = (self.current_player == 1)
-            _, best_move = self.minimax_corner(self.board, depth, float('-inf'), float('inf'), maximizing_player)
-            return best_move
-        elif strategy == "combo":
-            maximizing_player = (self.current_player == 1)
-            _, best_move = self.minimax_combo(self.board, depth, float('-inf'), float('inf'), maximizing_player)
-            return best_move
 
 
 
-
-def play_games(n, p1_strategy, p2_strategy):
+def play_games(n, p1_strategy, p2_strategy, board_class=Board, verbose=True, log_file=None, profiler=None, export=None):
     p1_wins = 0
     p2_wins = 0
     ties = 0
     for _ in range(n):
-        game = Blokus(board_dimensions, pieces, p1_strategy, p2_strategy)
-        value = game.play_game()
+        game = Blokus(board_dimensions, pieces, p1_strategy, p2_strategy, board_class, verbose, profiler=profiler)
+        value = game.play_game(log_file, export=export)
         if value == 1:
             p1_wins += 1
         elif value == 2:
@@ -682,8 +3340,8 @@ def play_games(n, p1_strategy, p2_strategy):
         else:
             ties += 1
     for _ in range(n):
-        game = Blokus(board_dimensions, pieces, p2_strategy, p1_strategy)
-        value = game.play_game()
+        game = Blokus(board_dimensions, pieces, p2_strategy, p1_strategy, board_class, verbose, profiler=profiler)
+        value = game.play_game(log_file, export=export)
         if value == 1:
             p2_wins += 1
         elif value == 2:
@@ -692,8 +3350,19 @@ def play_games(n, p1_strategy, p2_strategy):
             ties += 1
     return p1_wins, p2_wins, ties
 
-# Simulate games between strategies
-def play_all_strategies(scores):
+# plays n games each way between two policies of BatchGames, returns the
+# wins of each and the ties like play_games
+def play_batch_games(n, p1_policy, p2_policy, config=None, seed=None):
+    config = config or get_config(board_dimensions, pieces)
+    rng = np.random.default_rng(seed)
+    first = BatchGames(config, n, rng.integers(2 ** 32)).play([p1_policy, p2_policy])
+    second = BatchGames(config, n, rng.integers(2 ** 32)).play([p2_policy, p1_policy])
+    p1_wins = int((first == 1).sum() + (second == 2).sum())
+    p2_wins = int((first == 2).sum() + (second == 1).sum())
+    return p1_wins, p2_wins, 2 * n - p1_wins - p2_wins
+
+# Simulate games between strategies, with a profiler its report is printed at the end
+def play_all_strategies(scores, board_class=Board, verbose=True, log_file=None, profiler=None):
     strategies = list(scores.keys())
 
     # Play each pair of strategies
@@ -703,7 +3372,7 @@ def play_all_strategies(scores):
             strat2 = strategies[j]
 
             # Simulate games between the two strategies
-            p1_wins, p2_wins, ties = play_games(5, strat1, strat2)
+            p1_wins, p2_wins, ties = play_games(5, strat1, strat2, board_class, verbose, log_file, profiler)
 
             # Update scores for strat1 (player 1)
             scores[strat1][0] += p1_wins  # Wins
@@ -715,6 +3384,115 @@ def play_all_strategies(scores):
             scores[strat2][1] += p1_wins  # Losses
             scores[strat2][2] += ties     # Ties
     
+    if profiler is not None:
+        print(profiler.report())
+
+
+# plays one tournament game in a worker process, returns the game id,
+# 1 if strat1 won, 2 if strat2 won or 0 for a tie, and the game's record,
+# which holds the game's profiler summary when profiling. With a profile
+# file the game runs under cProfile and its stats are written to the file.
+def play_tournament_game(game_id, strat1, strat2, strat1_first, seed, board_class, profile=False, profile_file=None):
+    p1_strategy, p2_strategy = (strat1, strat2) if strat1_first else (strat2, strat1)
+    game = Blokus(board_dimensions, pieces, p1_strategy, p2_strategy, board_class, verbose=False, seed=seed,
+                  profiler=Profiler() if profile else None)
+    value = game.play_game(profile_file=profile_file)
+    if value != 0 and not strat1_first:
+        value = 3 - value
+    return game_id, value, game.record
+
+# Plays every pair of strategies n times with each going first, spread over
+# worker processes, and yields (game id, strat1, strat2, result, record) as games finish.
+# Each game gets its own seed derived from the tournament seed, and every
+# game starts with fresh search tables, so a game plays the same way no
+# matter which worker runs it or what it ran before. Games whose ids are in
+# skip are not played. The game numbered profile_game, counted from 0 in
+# the order the games are started, runs under cProfile into profile_file.
+def run_tournament(strategies, n=5, workers=None, seed=0, board_class=Board, skip=(), profile=False, profile_game=None,
+                   profile_file="blokus.prof"):
+    games = []
+    for i in range(len(strategies)):
+        for j in range(i + 1, len(strategies)):
+            for k in range(n):
+                for strat1_first in (True, False):
+                    game_id = f"{strategies[i]}|{strategies[j]}|{k}|{1 if strat1_first else 2}"
+                    if game_id not in skip:
+                        games.append((game_id, strategies[i], strategies[j], strat1_first))
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {}
+        for index, (game_id, strat1, strat2, strat1_first) in enumerate(games):
+            game_seed = random.Random(f"{seed}:{game_id}").getrandbits(32)
+            game_profile_file = profile_file if index == profile_game else None
+            future = executor.submit(
+                play_tournament_game, game_id, strat1, strat2, strat1_first, game_seed, board_class, profile, game_profile_file
+            )
+            futures[future] = (strat1, strat2)
+        for future in as_completed(futures):
+            game_id, value, record = future.result()
+            strat1, strat2 = futures[future]
+            yield game_id, strat1, strat2, value, record
+
+# adds the result of one game to the scores
+def record_result(scores, strat1, strat2, value):
+    if value == 1:
+        scores[strat1][0] += 1
+        scores[strat2][1] += 1
+    elif value == 2:
+        scores[strat2][0] += 1
+        scores[strat1][1] += 1
+    else:
+        scores[strat1][2] += 1
+        scores[strat2][2] += 1
+
+# Simulate games between strategies on several processes. With a results
+# file, every finished game is appended to it as a line of JSON, and games
+# already in the file are counted instead of played again, so an interrupted
+# tournament can be resumed. With a game log, the record of every game
+# played is appended to it as a line of JSON. With a profiler, every game
+# is profiled in its worker, the game the profiler selects runs under
+# cProfile, and the merged report is printed at the end.
+# With an export, a PositionWriter, the positions of every game played are
+# added to it as the games finish.
+def play_all_strategies_parallel(scores, n=5, workers=None, seed=0, board_class=Board, results_file=None, game_log=None,
+                                 profiler=None, export=None):
+    if export is not None and export.config is not get_config(board_dimensions, pieces):
+        raise ValueError("The export is of another configuration")
+    finished = set()
+    if results_file is not None and os.path.exists(results_file):
+        with open(results_file) as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    finished.add(result["game"])
+                    record_result(scores, result["strat1"], result["strat2"], result["result"])
+    
+    out = open(results_file, "a") if results_file is not None else None
+    log = open(game_log, "a") if game_log is not None else None
+    try:
+        games = run_tournament(
+            list(scores.keys()), n, workers, seed, board_class, finished, profiler is not None,
+            profiler.profile_game if profiler is not None else None, profiler.profile_file if profiler is not None else None
+        )
+        for game_id, strat1, strat2, value, record in games:
+            record_result(scores, strat1, strat2, value)
+            if profiler is not None:
+                profiler.merge(record["profile"])
+            if out is not None:
+                out.write(json.dumps({"game": game_id, "strat1": strat1, "strat2": strat2, "result": value}) + "\n")
+                out.flush()
+            if log is not None:
+                log.write(json.dumps(dict(record, game=game_id)) + "\n")
+            if export is not None:
+                export.add_game(record["moves"])
+    finally:
+        if out is not None:
+            out.close()
+        if log is not None:
+            log.close()
+    if profiler is not None:
+        print(profiler.report())
+
 
 
 # if __name__ == "__main__":